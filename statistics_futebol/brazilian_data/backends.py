@@ -0,0 +1,178 @@
+import functools
+import os
+import threading
+
+# Backends de armazenamento da BrasileiraoAPI. Os dois entregam um client com a API do pymongo,
+# então todos os métodos (consultas, agregações e tabelas) funcionam igual em qualquer um deles.
+
+CSV_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../data/campeonato-brasileiro-dataset.csv")
+
+
+# Registro de MongoClients do processo: instâncias com a mesma URI e opções dividem o mesmo client
+# (pool de conexões e threads de monitoramento), que só é fechado quando a última o libera.
+_clientes = {}
+_clientes_lock = threading.Lock()
+_clientes_pid = os.getpid()
+
+
+def _chave_cliente(uri, opcoes):
+    return (uri, tuple(sorted((nome, repr(valor)) for nome, valor in opcoes.items())))
+
+
+def _resetar_clientes():
+    # Depois de um fork os clients herdados não podem ser usados (o pymongo não é fork-safe):
+    # o filho esquece o registro sem fechar os sockets, que continuam sendo do processo pai
+    global _clientes_lock, _clientes_pid
+    _clientes.clear()
+    _clientes_lock = threading.Lock()
+    _clientes_pid = os.getpid()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_resetar_clientes)
+
+
+def _verificar_processo():
+    # Redundância para plataformas sem register_at_fork
+    if _clientes_pid != os.getpid():
+        _resetar_clientes()
+
+
+def obter_cliente(uri, **opcoes):
+    from pymongo import MongoClient
+
+    _verificar_processo()
+    chave = _chave_cliente(uri, opcoes)
+    with _clientes_lock:
+        registro = _clientes.get(chave)
+        if registro is None:
+            registro = _clientes[chave] = [MongoClient(uri, **opcoes), 0]
+        registro[1] += 1
+        return registro[0]
+
+
+def liberar_cliente(uri, **opcoes):
+    _verificar_processo()
+    chave = _chave_cliente(uri, opcoes)
+    with _clientes_lock:
+        registro = _clientes.get(chave)
+        if registro is None:
+            return
+        registro[1] -= 1
+        if registro[1] > 0:
+            return
+        del _clientes[chave]
+    registro[0].close()
+
+
+def fechar_clientes():
+    # Fecha todos os clients do registro (ex.: no fim de um worker)
+    _verificar_processo()
+    with _clientes_lock:
+        clientes = [cliente for cliente, _ in _clientes.values()]
+        _clientes.clear()
+    for cliente in clientes:
+        cliente.close()
+
+
+class BackendMongo:
+    nome = "mongodb"
+    suporta_explain = True
+    suporta_merge = True
+
+    def __init__(self, mongo_uri="mongodb://127.0.0.1:27017/", **opcoes):
+        # opcoes vão para o MongoClient: maxPoolSize, minPoolSize, serverSelectionTimeoutMS,
+        # connectTimeoutMS, socketTimeoutMS etc.
+        self.uri = mongo_uri
+        self.opcoes = opcoes
+
+    def conectar(self):
+        return obter_cliente(self.uri, **self.opcoes)
+
+    def desconectar(self, client):
+        liberar_cliente(self.uri, **self.opcoes)
+
+    def preparar(self, api):
+        pass
+
+    def opcoes_indice(self, especificacao):
+        return especificacao
+
+
+class BackendLocal:
+    # MongoDB em memória (mongomock, dependência opcional) carregado a partir do CSV do Kaggle.
+    # Não precisa de servidor nem de rede; $merge, explain e índices parciais não são suportados.
+    nome = "local"
+    suporta_explain = False
+    suporta_merge = False
+
+    def __init__(self, csv_path=CSV_PADRAO, host="brasileirao-local"):
+        self.csv_path = csv_path
+        self.uri = f"mongomock://{host}"
+        self.host = host
+
+    def conectar(self):
+        try:
+            import mongomock
+        except ImportError:
+            raise ImportError("O backend local precisa do pacote opcional 'mongomock' (pip install mongomock).") from None
+        _compatibilizar_mongomock()
+        return mongomock.MongoClient(self.host)
+
+    def desconectar(self, client):
+        # Os dados ficam no armazenamento compartilhado do mongomock; não há conexão para fechar
+        pass
+
+    def preparar(self, api):
+        # Os clients do mongomock com o mesmo host dividem os dados: o CSV só é carregado na primeira vez
+        if self.csv_path and not api.collection.estimated_document_count():
+            api.importar_csv_para_mongodb(self.csv_path)
+
+    def opcoes_indice(self, especificacao):
+        # O mongomock ignora partialFilterExpression: um índice único parcial (ID_season só vale para
+        # partidas com ID) recusaria as partidas sem ID, então aqui ele é criado sem unique
+        if "partialFilterExpression" in especificacao:
+            especificacao.pop("unique", None)
+        return especificacao
+
+
+@functools.lru_cache(maxsize=None)
+def _compatibilizar_mongomock():
+    # O pymongo 4.9+ passa sort= às operações do bulk_write, parâmetro que o mongomock ainda não aceita.
+    # O ajuste vale para o processo inteiro (é feito na classe do mongomock, uma única vez) e só aceita
+    # sort=None; um sort de verdade, que o mongomock não saberia aplicar, continua sendo recusado.
+    import inspect
+    from mongomock.collection import BulkOperationBuilder
+
+    for nome in ("add_update", "add_replace", "add_delete"):
+        metodo = getattr(BulkOperationBuilder, nome)
+        if "sort" in inspect.signature(metodo).parameters or getattr(metodo, "_ignora_sort", False):
+            continue
+
+        @functools.wraps(metodo)
+        def sem_sort(self, *args, _metodo=metodo, sort=None, **kwargs):
+            if sort is not None:
+                raise NotImplementedError("O backend local não suporta sort nas operações do bulk_write")
+            return _metodo(self, *args, **kwargs)
+        sem_sort._ignora_sort = True
+        setattr(BulkOperationBuilder, nome, sem_sort)
+
+
+BACKENDS = {
+    BackendMongo.nome: BackendMongo,
+    BackendLocal.nome: BackendLocal
+}
+
+
+def criar_backend(backend=None, mongo_uri="mongodb://127.0.0.1:27017/", **opcoes):
+    # Aceita uma instância pronta, o nome de um backend ou None (MongoDB em mongo_uri);
+    # opcoes vão para o construtor do backend escolhido pelo nome
+    if backend is None or backend == BackendMongo.nome:
+        return BackendMongo(mongo_uri, **opcoes)
+    if isinstance(backend, str):
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend desconhecido: {backend} (opções: {', '.join(BACKENDS)})")
+        return BACKENDS[backend](**opcoes)
+    if opcoes:
+        raise ValueError("Opções de conexão só valem com o backend indicado pelo nome")
+    return backend
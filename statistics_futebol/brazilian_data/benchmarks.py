@@ -0,0 +1,368 @@
+import argparse
+import json
+import os
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from backends import BackendLocal
+from brasileirao_api import BrasileiraoAPI
+
+CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../data/campeonato-brasileiro-dataset.csv")
+JSON_PATH = os.path.join(os.path.dirname(CSV_PATH), "brasileirao_dates.json")
+
+
+def carregar_partidas_csv(csv_path=CSV_PATH):
+    # Monta o mesmo formato de carregar_partidas_planas direto do CSV, sem precisar do MongoDB
+    df = pd.read_csv(csv_path, dtype=BrasileiraoAPI.CSV_DTYPES)
+    data_hora = pd.to_datetime(df["data"] + " " + df["hora"], format="%d/%m/%Y %H:%M")
+    partidas = pd.DataFrame({
+        "season": data_hora.dt.year,
+        "rodada": df["rodada"],
+        "data_hora": data_hora,
+        "home": df["mandante"].astype(str),
+        "away": df["visitante"].astype(str),
+        "home_goals": df["mandante_Placar"],
+        "away_goals": df["visitante_Placar"]
+    })
+    return BrasileiraoAPI._tipar_partidas(partidas)
+
+
+def partidas_sinteticas(linhas, n_times=40, start_year=2003, end_year=2022, seed=42):
+    rng = np.random.default_rng(seed)
+    home = rng.integers(0, n_times, linhas)
+    away = (home + rng.integers(1, n_times, linhas)) % n_times
+    partidas = pd.DataFrame({
+        "season": rng.integers(start_year, end_year + 1, linhas),
+        "rodada": rng.integers(1, 39, linhas),
+        "data_hora": pd.NaT,
+        "home": [f"Time {i:02d}" for i in home],
+        "away": [f"Time {i:02d}" for i in away],
+        "home_goals": rng.poisson(1.5, linhas),
+        "away_goals": rng.poisson(1.1, linhas)
+    })
+    return BrasileiraoAPI._tipar_partidas(partidas)
+
+
+def montar_tabelas_iterrows(partidas, start_year=2003, end_year=2022):
+    # Referência: o loop por partida que montar_tabelas usava antes da versão vetorizada
+    partidas = partidas[(partidas["season"] >= start_year) & (partidas["season"] <= end_year)]
+    tabelas = {str(season): {} for season in range(start_year, end_year + 1)}
+
+    def atualizar_time(tabela, time, gols_feitos, gols_sofridos):
+        if time not in tabela:
+            tabela[time] = {estatistica: 0 for estatistica in BrasileiraoAPI.ESTATISTICAS}
+        tabela[time]["jogos"] += 1
+        tabela[time]["gols_marcados"] += gols_feitos
+        tabela[time]["gols_sofridos"] += gols_sofridos
+        if gols_feitos > gols_sofridos:
+            tabela[time]["vitorias"] += 1
+            tabela[time]["pontos"] += 3
+        elif gols_feitos == gols_sofridos:
+            tabela[time]["empates"] += 1
+            tabela[time]["pontos"] += 1
+        else:
+            tabela[time]["derrotas"] += 1
+
+    for _, row in partidas.iterrows():
+        tabela = tabelas[str(row["season"])]
+        home_goals = int(row["home_goals"])
+        away_goals = int(row["away_goals"])
+        atualizar_time(tabela, row["home"], home_goals, away_goals)
+        atualizar_time(tabela, row["away"], away_goals, home_goals)
+    return tabelas
+
+
+def cronometrar(funcao, *args, repeticoes=1):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = perf_counter()
+        resultado = funcao(*args)
+        melhor = min(melhor, perf_counter() - inicio)
+    return melhor, resultado
+
+
+def sem_cache(funcao):
+    # Os métodos com _cache_resultado devolveriam o resultado guardado a partir da segunda repetição
+    def medir(*args):
+        BrasileiraoAPI.limpar_cache()
+        return funcao(*args)
+    return medir
+
+
+def bench_tabelas(linhas_sinteticas=1_000_000):
+    cenarios = [("CSV", carregar_partidas_csv())]
+    if linhas_sinteticas:
+        cenarios.append(("sintético", partidas_sinteticas(linhas_sinteticas)))
+
+    print("montar_tabelas: iterrows x vetorizado")
+    for nome, partidas in cenarios:
+        tempo_ref, esperado = cronometrar(montar_tabelas_iterrows, partidas)
+        tempo_vet, obtido = cronometrar(BrasileiraoAPI.calcular_tabelas, partidas, repeticoes=3)
+        assert obtido == esperado, f"Resultado divergente no cenário {nome}"
+        print(f"- {nome} ({len(partidas)} partidas): iterrows {tempo_ref:.3f}s | "
+              f"vetorizado {tempo_vet:.3f}s | {tempo_ref / tempo_vet:.0f}x")
+
+
+def criar_api(mongo_uri=None):
+    # Sem URI usa o backend local (em memória, carregado com o CSV)
+    if mongo_uri:
+        return BrasileiraoAPI(mongo_uri)
+    return BrasileiraoAPI(backend=BackendLocal(CSV_PATH))
+
+
+def criar_api_descartavel(mongo_uri=None, db_name="benchmark_brasileirao"):
+    # Banco próprio para os modos que escrevem: as collections de trabalho não são tocadas
+    if mongo_uri:
+        api = BrasileiraoAPI(mongo_uri, db_name=db_name)
+    else:
+        api = BrasileiraoAPI(backend=BackendLocal(csv_path=None, host="benchmark"), db_name=db_name)
+    api.client.drop_database(db_name)
+    return api
+
+
+def bench_agregados(api, alteradas=200, removidas=50, seed=42):
+    import tempfile
+    print("Agregados: manutenção incremental x reconstrução completa")
+    try:
+        tempo_carga, _ = cronometrar(api.importar_json_com_upsert, JSON_PATH)
+        print(f"- importar_json_com_upsert (carga inicial): {tempo_carga:.2f}s")
+
+        # Muda o placar de algumas partidas e reimporta: só as alteradas passam por atualizar_agregados
+        with open(JSON_PATH, encoding="utf-8") as f:
+            registros = json.load(f)
+        rng = np.random.default_rng(seed)
+        for i in rng.choice(len(registros), alteradas, replace=False):
+            registros[i]["mandante_Placar"] = int(registros[i]["mandante_Placar"]) + int(rng.integers(1, 3))
+        with tempfile.TemporaryDirectory() as diretorio:
+            json_path = os.path.join(diretorio, "alterado.json")
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(registros, f, ensure_ascii=False)
+            tempo_upsert, _ = cronometrar(api.importar_json_com_upsert, json_path)
+        print(f"- importar_json_com_upsert ({alteradas} placares alterados): {tempo_upsert:.2f}s")
+
+        ids = [int(registros[i]["ID"]) for i in rng.choice(len(registros), removidas, replace=False)]
+        tempo_remocao, _ = cronometrar(api.remover_partidas, {"ID": {"$in": ids}})
+        print(f"- remover_partidas ({removidas} partidas): {tempo_remocao:.2f}s")
+
+        tempo_reconstrucao, linhas = conferir_agregados(api)
+        print(f"- reconstrução completa (montar_tabelas + odds_todos_times): {tempo_reconstrucao:.2f}s | "
+              f"{linhas} linhas de odds iguais às incrementais")
+
+        # Recarga do notebook: limpar_colecao subtrai tudo e a carga em lotes soma de novo
+        api.limpar_colecao()
+        assert not api.db["odds_times_aggregados"].count_documents({}), "limpar_colecao deixou odds para trás"
+        tempo_lotes, _ = cronometrar(api.importar_json_para_mongodb, JSON_PATH, True)
+        _, linhas = conferir_agregados(api)
+        print(f"- limpar_colecao + importar_json_para_mongodb(streaming=True): {tempo_lotes:.2f}s | "
+              f"{linhas} linhas de odds iguais às incrementais")
+    finally:
+        api.client.drop_database(api.db_name)
+
+
+def conferir_agregados(api):
+    BrasileiraoAPI.limpar_cache()
+    seasons = [season for season in api.collection.distinct("season") if season is not None]
+    start_year, end_year = min(seasons), max(seasons)
+    tempo_tabelas, tabelas = cronometrar(api.montar_tabelas, start_year, end_year)
+    tempo_odds, odds = cronometrar(api.odds_todos_times, start_year, end_year)
+    esperado = {season: tabela for season, tabela in json.loads(tabelas).items() if tabela}
+    obtido = {doc["season"]: doc["tabela"] for doc in api.db["tabelas_aggregadas"].find({}, {"_id": 0})
+              if doc["tabela"]}
+    assert obtido == esperado, "tabelas_aggregadas divergem da reconstrução completa"
+    esperado = {(doc["time"], doc["season"]): doc for doc in odds}
+    obtido = {(doc["time"], doc["season"]): doc for doc in api.db["odds_times_aggregados"].find({}, {"_id": 0})}
+    assert obtido == esperado, "odds_times_aggregados divergem da reconstrução completa"
+    return tempo_tabelas + tempo_odds, len(esperado)
+
+
+def bench_backup_incremental(api, alteradas=100, compressao="gzip"):
+    import tempfile
+    print("Backup incremental: cadeia de snapshots x collections vivas")
+
+    def estado():
+        return {nome: sorted(api.iter_documentos(collection_name=nome), key=lambda doc: str(doc["_id"]))
+                for nome in api.db.list_collection_names()}
+
+    def conferir(snapshot_dir, esperado):
+        for nome, documentos in esperado.items():
+            obtidos = sorted(BrasileiraoAPI.iter_documentos_backup(snapshot_dir, nome), key=lambda doc: str(doc["_id"]))
+            assert obtidos == documentos, f"{os.path.basename(snapshot_dir)}/{nome} diverge da collection viva"
+
+    def alterar(rodada):
+        # Placares alterados, partidas removidas e partidas novas, como numa recarga real
+        amostra = [doc["_id"] for doc in api.collection.aggregate([{"$sample": {"size": 2 * alteradas}}])]
+        api.collection.update_many({"_id": {"$in": amostra[:alteradas]}}, {"$inc": {"score.fullTime.home": 1}})
+        api.collection.delete_many({"_id": {"$in": amostra[alteradas:]}})
+        novas = list(api.collection.find({}, {"_id": 0}).limit(alteradas))
+        for i, doc in enumerate(novas):
+            doc["ID"] = 100_000 * rodada + i
+        api.collection.insert_many(novas)
+        api.db["tabelas_aggregadas"].update_one({}, {"$set": {"revisao": rodada}})
+
+    try:
+        api.importar_csv_para_mongodb(CSV_PATH)
+        api.inserir_tabelas_no_mongodb()
+        with tempfile.TemporaryDirectory() as diretorio:
+            snapshots = []
+            for rodada in range(3):
+                if rodada:
+                    alterar(rodada)
+                snapshot_dir = os.path.join(diretorio, f"{api.db_name}_backup_{rodada}")
+                os.makedirs(snapshot_dir)
+                base = snapshots[-1][0] if snapshots else None
+                tempo, _ = cronometrar(api._backup_ndjson, snapshot_dir, api.db_name, compressao, None, None, base)
+                manifesto = BrasileiraoAPI._ler_manifesto(snapshot_dir)
+                gravados = sum(info["gravados"] for info in manifesto["collections"].values())
+                tamanho = sum(info["bytes"] for info in manifesto["collections"].values())
+                print(f"- snapshot {rodada} ({manifesto['tipo']}): {tempo:.2f}s | {gravados} documentos gravados | "
+                      f"{tamanho / 1024:.0f} KiB")
+                snapshots.append((snapshot_dir, estado()))
+
+            # Cada snapshot da cadeia continua reconstruindo o estado do momento em que foi gravado
+            for snapshot_dir, esperado in snapshots:
+                conferir(snapshot_dir, esperado)
+            reconstruido = os.path.join(diretorio, "reconstruido")
+            api.reconstruir_backup(snapshots[-1][0], reconstruido, compressao)
+            conferir(reconstruido, snapshots[-1][1])
+            print(f"- iter_documentos_backup de {len(snapshots)} snapshots e do reconstruído iguais às collections vivas")
+    finally:
+        api.client.drop_database(api.db_name)
+
+
+def bench_tabelas_servidor(api, repeticoes=3):
+    print("Tabelas por temporada: cliente x servidor")
+    tempo_cliente, tabelas = cronometrar(sem_cache(api.montar_tabelas), repeticoes=repeticoes)
+    tempo_servidor, tabelas_servidor = cronometrar(sem_cache(api.montar_tabelas_no_servidor), repeticoes=repeticoes)
+    esperado = {season: tabela for season, tabela in json.loads(tabelas).items() if tabela}
+    assert tabelas_servidor == esperado, "Tabelas do servidor divergem do cálculo no cliente"
+    print(f"- montar_tabelas (cliente): {tempo_cliente:.3f}s")
+    print(f"- montar_tabelas_no_servidor: {tempo_servidor:.3f}s | {tempo_cliente / tempo_servidor:.1f}x")
+
+    destino = "tabelas_aggregadas_benchmark"
+    try:
+        tempo_merge, _ = cronometrar(api.inserir_tabelas_no_mongodb, 2003, 2022, destino, True,
+                                     repeticoes=repeticoes)
+        print(f"- inserir_tabelas_no_mongodb(no_servidor=True): {tempo_merge:.3f}s")
+    except NotImplementedError:
+        print("- $merge não suportado por este backend; etapa ignorada")
+    finally:
+        api.db.drop_collection(destino)
+
+
+def bench_match_store(api, repeticoes=20):
+    print("Consultas: MongoDB x MatchStore")
+    store = api.carregar_match_store()
+    consultas = [
+        ("obter_partidas_time", ("Flamengo",)),
+        ("buscar_partidas_por_confronto", ("Flamengo", "Fluminense")),
+        ("buscar_partidas_por_time_or", ("Flamengo", "Fluminense")),
+        ("buscar_partidas_por_rodadas", ([1, 2],))
+    ]
+    for metodo, argumentos in consultas:
+        tempo_api, esperado = cronometrar(getattr(api, metodo), *argumentos, repeticoes=repeticoes)
+        tempo_store, obtido = cronometrar(getattr(store, metodo), *argumentos, repeticoes=repeticoes)
+        assert len(obtido) == len(esperado), f"{metodo}: {len(obtido)} != {len(esperado)}"
+        print(f"- {metodo}: MongoDB {tempo_api * 1e3:.2f}ms | MatchStore {tempo_store * 1e3:.3f}ms | "
+              f"{tempo_api / tempo_store:.0f}x")
+
+
+def bench_graficos(api, processos=(1, None)):
+    import tempfile
+    print("exportar_graficos_times: processo único x pool")
+    tempos = {}
+    for n in processos:
+        with tempfile.TemporaryDirectory() as diretorio:
+            tempos[n], arquivos = cronometrar(sem_cache(api.exportar_graficos_times), diretorio, ("png",), None, 2003, 2022, n)
+        print(f"- processos={n or os.cpu_count()}: {tempos[n]:.2f}s ({len(arquivos)} arquivos)")
+    if len(tempos) > 1:
+        print(f"- speedup: {tempos[processos[0]] / tempos[processos[-1]]:.1f}x")
+
+
+def bench_snapshot(api, repeticoes=5):
+    import tempfile
+    print("Carga do histórico: MongoDB x JSON x snapshot colunar (mmap)")
+    json_path = JSON_PATH
+    tempo_mongo, _ = cronometrar(api.carregar_partidas_planas, repeticoes=repeticoes)
+    print(f"- carregar_partidas_planas: {tempo_mongo * 1e3:.1f}ms")
+    if os.path.exists(json_path):
+        def ler_json():
+            with open(json_path, encoding="utf-8") as f:
+                return json.load(f)
+        tempo_json, _ = cronometrar(ler_json, repeticoes=repeticoes)
+        print(f"- json.load(brasileirao_dates.json): {tempo_json * 1e3:.1f}ms")
+    with tempfile.TemporaryDirectory() as diretorio:
+        api.exportar_snapshot_colunar(diretorio)
+        tempo_snapshot, snapshot = cronometrar(BrasileiraoAPI.carregar_snapshot_colunar, diretorio,
+                                               repeticoes=repeticoes)
+        print(f"- carregar_snapshot_colunar: {tempo_snapshot * 1e3:.1f}ms ({len(snapshot['partidas'])} partidas) | "
+              f"{tempo_mongo / tempo_snapshot:.0f}x")
+
+
+def bench_startup(limite_ms=None, repeticoes=5):
+    # Import + construção da API num processo novo; -X importtime mostra se algo pesado voltou a ser importado
+    import subprocess
+    import sys
+
+    codigo = ("from time import perf_counter; inicio = perf_counter(); "
+              "from brasileirao_api import BrasileiraoAPI; BrasileiraoAPI(); print(perf_counter() - inicio)")
+    pesados = {"pandas", "matplotlib", "pymongo"}
+    print("Startup: import brasileirao_api + BrasileiraoAPI()")
+    melhor = float("inf")
+    importados = set()
+    for _ in range(repeticoes):
+        processo = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo], capture_output=True,
+                                  text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        melhor = min(melhor, float(processo.stdout.strip()))
+        for linha in processo.stderr.splitlines():
+            if linha.startswith("import time:") and "|" in linha:
+                importados.add(linha.rsplit("|", 1)[1].strip().split(".")[0])
+
+    carregados = sorted(importados & pesados)
+    print(f"- import + construção: {melhor * 1e3:.1f}ms | módulos pesados importados: {', '.join(carregados) or 'nenhum'}")
+    if carregados:
+        raise SystemExit(f"Regressão: {', '.join(carregados)} voltaram a ser importados no startup")
+    if limite_ms is not None and melhor * 1e3 > limite_ms:
+        raise SystemExit(f"Regressão: startup de {melhor * 1e3:.1f}ms acima do limite de {limite_ms}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks da BrasileiraoAPI")
+    parser.add_argument("--linhas", type=int, default=1_000_000,
+                        help="tamanho do dataset sintético (0 para pular)")
+    parser.add_argument("--servidor", action="store_true",
+                        help="compara o cálculo das tabelas no cliente e no MongoDB")
+    parser.add_argument("--match-store", action="store_true",
+                        help="compara as consultas no MongoDB e no MatchStore")
+    parser.add_argument("--graficos", action="store_true",
+                        help="compara a exportação dos gráficos em um processo e no pool")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="compara a carga do histórico pelo MongoDB e pelo snapshot colunar")
+    parser.add_argument("--startup", action="store_true",
+                        help="mede import + construção da API com python -X importtime")
+    parser.add_argument("--limite-ms", type=float, default=None,
+                        help="com --startup, falha se import + construção passar deste tempo")
+    parser.add_argument("--agregados", action="store_true",
+                        help="confere os agregados incrementais com a reconstrução completa (banco descartável)")
+    parser.add_argument("--backup-incremental", action="store_true",
+                        help="confere a cadeia de backups incrementais com as collections vivas (banco descartável)")
+    parser.add_argument("--mongo-uri", default=None,
+                        help="MongoDB com a coleção brasileirao carregada (padrão: mongomock)")
+    args = parser.parse_args()
+    if args.startup:
+        bench_startup(args.limite_ms)
+    elif args.servidor:
+        bench_tabelas_servidor(criar_api(args.mongo_uri))
+    elif args.match_store:
+        bench_match_store(criar_api(args.mongo_uri))
+    elif args.graficos:
+        bench_graficos(criar_api(args.mongo_uri))
+    elif args.snapshot:
+        bench_snapshot(criar_api(args.mongo_uri))
+    elif args.agregados:
+        bench_agregados(criar_api_descartavel(args.mongo_uri))
+    elif args.backup_incremental:
+        bench_backup_incremental(criar_api_descartavel(args.mongo_uri))
+    else:
+        bench_tabelas(args.linhas)
@@ -1,95 +1,622 @@
-from pymongo import MongoClient
-import pandas as pd
-import matplotlib.pyplot as plt
+import functools
+import hashlib
 import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from time import perf_counter
+
+from backends import criar_backend
+from registro_times import normalizar_time
+
+
+# Cache de resultados compartilhado por todas as instâncias do processo.
+# A chave inclui a coleção principal e a versão do banco, que todo método de escrita incrementa
+# (a versão é do banco inteiro porque há escritas em outras coleções, ex.: limpar_colecao_por_nome).
+CACHE_TAMANHO_MAXIMO = 128
+_cache_resultados = OrderedDict()
+_versoes_bancos = {}
+_cache_lock = threading.Lock()
+
+
+def _cache_resultado(metodo):
+    @functools.wraps(metodo)
+    def wrapper(self, *args, **kwargs):
+        banco = self._chave_banco()
+        with _cache_lock:
+            chave = (banco, _versoes_bancos.get(banco, 0), self.collection_name, metodo.__name__,
+                     _chave_argumentos(args, kwargs))
+            if chave in _cache_resultados:
+                _cache_resultados.move_to_end(chave)
+                return _copiar(_cache_resultados[chave])
+
+        resultado = metodo(self, *args, **kwargs)
+        with _cache_lock:
+            _cache_resultados[chave] = resultado
+            while len(_cache_resultados) > CACHE_TAMANHO_MAXIMO:
+                _cache_resultados.popitem(last=False)
+        return _copiar(resultado)
+    return wrapper
+
+
+def _chave_argumentos(args, kwargs):
+    # Filtros do MongoDB são dicts (não hasheáveis); o JSON ordenado vira uma chave estável.
+    # repr separa tipos que o JSON não conhece (datetime, ObjectId) de strings com o mesmo texto
+    return json.dumps([args, kwargs], sort_keys=True, default=repr)
+
+
+def _copiar(valor):
+    # Cópia das listas/dicts do cache para que quem chama possa alterá-las (ex.: insert_many adiciona _id)
+    if isinstance(valor, dict):
+        return {chave: _copiar(item) for chave, item in valor.items()}
+    if isinstance(valor, list):
+        return [_copiar(item) for item in valor]
+    return valor
+
+
+def _invalida_cache(metodo):
+    @functools.wraps(metodo)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return metodo(self, *args, **kwargs)
+        finally:
+            self._invalidar_cache()
+    return wrapper
 
 
 class BrasileiraoAPI:
+    # Tipos explícitos para ler o CSV do Kaggle direto, sem passar pelo JSON intermediário
+    CSV_DTYPES = {
+        "ID": "int32",
+        "rodada": "int8",
+        "data": "object",
+        "hora": "object",
+        "mandante": "category",
+        "visitante": "category",
+        "formacao_mandante": "category",
+        "formacao_visitante": "category",
+        "tecnico_mandante": "object",
+        "tecnico_visitante": "object",
+        "vencedor": "category",
+        "arena": "category",
+        "mandante_Placar": "int8",
+        "visitante_Placar": "int8",
+        "mandante_Estado": "category",
+        "visitante_Estado": "category"
+    }
+
+    # Projeções mínimas usadas pelos métodos internos
+    PROJECAO_PLACARES = {"_id": 0, "homeTeam.name": 1, "awayTeam.name": 1, "score.fullTime": 1, "season": 1}
+    BATCH_SIZE_CURSOR = 5000
+
+    # Backups NDJSON: extensão dos arquivos por compressão (zstd depende do pacote opcional zstandard)
+    BACKUP_EXTENSOES = {None: ".ndjson", "gzip": ".ndjson.gz", "zstd": ".ndjson.zst"}
+
+    ESTATISTICAS = ["jogos", "vitorias", "empates", "derrotas", "gols_marcados", "gols_sofridos", "pontos"]
+    CHAVES_ODDS = ["homeWin", "draw", "awayWin"]
+
+    # Formato plano das partidas: uma coluna por campo, já com tipos compactos
+    COLUNAS_PLANAS = {
+        "season": "int16",
+        "rodada": "int8",
+        "data_hora": "datetime64[ns]",
+        "home": "category",
+        "away": "category",
+        "home_goals": "int8",
+        "away_goals": "int8"
+    }
+
+    # Índices por coleção; "partidas" é a coleção principal (self.collection)
+    INDICES = {
+        "partidas": [
+            {"keys": [("ID", 1), ("season", 1)], "name": "ID_season", "unique": True,
+             "partialFilterExpression": {"ID": {"$exists": True}}},
+            {"keys": [("homeTeam.name", 1), ("season", 1)], "name": "mandante_season"},
+            {"keys": [("awayTeam.name", 1), ("season", 1)], "name": "visitante_season"},
+            {"keys": [("rodada", 1)], "name": "rodada"},
+            {"keys": [("season", 1)], "name": "season"},
+            {"keys": [("data_hora", 1)], "name": "data_hora"},
+            {"keys": [("homeTeam.chave", 1), ("awayTeam.chave", 1)], "name": "chave_mandante_visitante"},
+            {"keys": [("awayTeam.chave", 1)], "name": "chave_visitante"}
+        ],
+        "odds_times_aggregados": [
+            {"keys": [("time", 1), ("season", 1)], "name": "time_season", "unique": True}
+        ],
+        "tabelas_aggregadas": [
+            {"keys": [("season", 1)], "name": "season", "unique": True}
+        ]
+    }
+
     def __init__(self, mongo_uri="mongodb://127.0.0.1:27017/", 
-                 db_name="statistics_futebol", collection_name="brasileirao"):
-        self.client = MongoClient(mongo_uri)
-        self.db = self.client[db_name]
-        self.collection = self.db[collection_name]
+                 db_name="statistics_futebol", collection_name="brasileirao", backend=None, **opcoes_cliente):
+        # backend: None/"mongodb" (servidor em mongo_uri), "local" (em memória, a partir do CSV) ou uma instância.
+        # opcoes_cliente ajustam o MongoClient compartilhado (maxPoolSize, serverSelectionTimeoutMS, ...)
+        self.backend = criar_backend(backend, mongo_uri, **opcoes_cliente)
+        self.mongo_uri = self.backend.uri
+        self.db_name = db_name
+        self.collection_name = collection_name
+        # A conexão só é aberta no primeiro acesso a client/db/collection
+        self._client = None
+        self._pid = None
+
+    @property
+    def client(self):
+        # Depois de um fork (ex.: ProcessPoolExecutor) o processo filho pega o próprio client
+        if self._client is None or self._pid != os.getpid():
+            self._client = self.backend.conectar()
+            self._pid = os.getpid()
+            self.backend.preparar(self)
+        return self._client
+
+    def close(self):
+        # Devolve o client ao registro; o último a sair fecha o pool de conexões
+        if self._client is not None and self._pid == os.getpid():
+            self.backend.desconectar(self._client)
+        self._client = None
+        self._pid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.close()
+
+    @property
+    def db(self):
+        return self.client[self.db_name]
+
+    @property
+    def collection(self):
+        return self.db[self.collection_name]
+
+    def _chave_banco(self):
+        return (self.mongo_uri, self.db_name)
+
+    def _invalidar_cache(self):
+        banco = self._chave_banco()
+        with _cache_lock:
+            _versoes_bancos[banco] = _versoes_bancos.get(banco, 0) + 1
+
+    @staticmethod
+    def limpar_cache():
+        with _cache_lock:
+            _cache_resultados.clear()
              
-    def importar_json_para_mongodb(self, json_path):
+    @_invalida_cache
+    def importar_json_para_mongodb(self, json_path, streaming=False, batch_size=1000):
+        if streaming:
+            return self.importar_json_em_lotes(json_path, batch_size=batch_size)
+
         import pandas as pd
         df = pd.read_json(json_path)
         
         registros = df.to_dict(orient='records')
         
-        documentos = []
-        for record in registros:
-            documento = {
-                "ID": record.get("ID"),
-                "rodada": record.get("rodada"),
-                "data": record.get("data"),
-                "hora": record.get("hora"),
-                "homeTeam": {
-                    "name": record.get("mandante"),
-                    "formacao": record.get("formacao_mandante"),
-                    "tecnico": record.get("tecnico_mandante"),
-                    "estado": record.get("mandante_Estado")
-                },
-                "awayTeam": {
-                    "name": record.get("visitante"),
-                    "formacao": record.get("formacao_visitante"),
-                    "tecnico": record.get("tecnico_visitante"),
-                    "estado": record.get("visitante_Estado")
-                },
-                "score": {
-                    "fullTime": {
-                        "home": int(record.get("mandante_Placar")),
-                        "away": int(record.get("visitante_Placar"))
-                    }
-                },
-                "vencedor": record.get("vencedor"),
-                "arena": record.get("arena")
-            }
-            documentos.append(documento)
+        documentos = [self._montar_documento(record) for record in registros]
         
         if documentos:
             self.collection.insert_many(documentos)
             print(f"Inseridos {len(documentos)} documentos no MongoDB.")
+            self.atualizar_agregados(adicionadas=documentos)
         else:
             print("Nenhum documento para inserir.")
+        return len(documentos)
 
+    @_invalida_cache
+    def importar_json_em_lotes(self, json_path, batch_size=1000):
+        # Lê o arquivo aos poucos e envia lotes não ordenados, sem manter o dataset inteiro em memória
+        documentos = (self._montar_documento(record) for record in self._ler_json_incremental(json_path))
+        return self._inserir_em_lotes(documentos, batch_size)
+
+    @_invalida_cache
+    def importar_csv_para_mongodb(self, csv_path, batch_size=1000):
+        import pandas as pd
+
+        leitor = pd.read_csv(csv_path, dtype=self.CSV_DTYPES, chunksize=batch_size)
+        return self._inserir_em_lotes(self._documentos_csv(leitor), batch_size)
+
+    def _documentos_csv(self, leitor):
+        import pandas as pd
+
+        for chunk in leitor:
+            # data e hora são convertidas uma única vez, já vetorizadas por lote
+            chunk["data_hora"] = pd.to_datetime(
+                chunk["data"] + " " + chunk["hora"], format="%d/%m/%Y %H:%M", errors="coerce"
+            )
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            for record in chunk.to_dict(orient="records"):
+                yield self._montar_documento(record)
+
+    @_invalida_cache
+    def importar_json_com_upsert(self, json_path, batch_size=1000):
+        from pymongo import ReplaceOne
+
+        # Recarga idempotente: a chave natural é ID + season e só vão para o banco linhas novas ou alteradas
+        existentes = {
+            (doc.get("ID"), doc.get("season")): doc
+            for doc in self.collection.find(
+                {"ID": {"$exists": True}},
+                dict(self.PROJECAO_PLACARES, ID=1, hash_conteudo=1)
+            )
+        }
+
+        inicio = perf_counter()
+        resultado = {"novos": 0, "alterados": 0, "inalterados": 0}
+        operacoes = []
+        adicionadas = []
+        removidas = []
+        for record in self._ler_json_incremental(json_path):
+            documento = self._montar_documento(record)
+            documento["hash_conteudo"] = self._hash_documento(documento)
+            chave = (documento["ID"], documento["season"])
+            anterior = existentes.get(chave)
+
+            if anterior is None:
+                resultado["novos"] += 1
+            elif anterior.get("hash_conteudo") != documento["hash_conteudo"]:
+                resultado["alterados"] += 1
+            else:
+                resultado["inalterados"] += 1
+                continue
+
+            if self._resumo_partida(anterior) != self._resumo_partida(documento):
+                if anterior is not None:
+                    removidas.append(anterior)
+                adicionadas.append(documento)
+
+            operacoes.append(ReplaceOne({"ID": chave[0], "season": chave[1]}, documento, upsert=True))
+            if len(operacoes) >= batch_size:
+                self.collection.bulk_write(operacoes, ordered=False)
+                operacoes = []
+        if operacoes:
+            self.collection.bulk_write(operacoes, ordered=False)
+        self.atualizar_agregados(adicionadas, removidas)
+
+        duracao = perf_counter() - inicio
+        print(f"Upsert concluído em {duracao:.2f}s:")
+        print(f"- Documentos novos: {resultado['novos']}")
+        print(f"- Documentos alterados: {resultado['alterados']}")
+        print(f"- Documentos inalterados: {resultado['inalterados']}")
+        return resultado
+
+    @staticmethod
+    def _hash_documento(documento):
+        conteudo = {k: v for k, v in documento.items() if k not in ("_id", "hash_conteudo")}
+        serializado = json.dumps(conteudo, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(serializado.encode("utf-8")).hexdigest()
+
+    def _inserir_em_lotes(self, documentos, batch_size=1000, collection=None):
+        collection = self.collection if collection is None else collection
+        # Partidas da collection principal entram nos agregados; só o resumo de cada uma fica em memória
+        resumos = [] if collection.full_name == self.collection.full_name else None
+        inicio = perf_counter()
+        total = 0
+        lote = []
+        for documento in documentos:
+            lote.append(documento)
+            if resumos is not None:
+                resumos.append(self._resumo_partida(documento))
+            if len(lote) >= batch_size:
+                collection.insert_many(lote, ordered=False)
+                total += len(lote)
+                lote = []
+        if lote:
+            collection.insert_many(lote, ordered=False)
+            total += len(lote)
+
+        duracao = perf_counter() - inicio
+        if total:
+            taxa = total / duracao if duracao > 0 else float("inf")
+            print(f"Inseridos {total} documentos no MongoDB em {duracao:.2f}s ({taxa:.0f} linhas/s).")
+        else:
+            print("Nenhum documento para inserir.")
+        if resumos:
+            self._aplicar_resumos(resumos)
+        return total
+
+    @staticmethod
+    def _ler_json_incremental(json_path, chunk_size=64 * 1024):
+        # Aceita tanto um array JSON (como o gerado pelo notebook) quanto NDJSON
+        decoder = json.JSONDecoder()
+        separadores = " \t\r\n[,]"
+        buffer = ""
+        pos = 0
+        eof = False
+        with open(json_path, "r", encoding="utf-8") as f:
+            while True:
+                while pos < len(buffer) and buffer[pos] in separadores:
+                    pos += 1
+                if pos < len(buffer):
+                    try:
+                        record, pos = decoder.raw_decode(buffer, pos)
+                        yield record
+                        continue
+                    except json.JSONDecodeError:
+                        if eof:
+                            raise
+                elif eof:
+                    break
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+
+    @staticmethod
+    def _data_hora(data, hora=None):
+        for texto, formato in ((f"{data} {hora}", "%d/%m/%Y %H:%M"), (data, "%d/%m/%Y")):
+            try:
+                return datetime.strptime(texto, formato)
+            except (TypeError, ValueError):
+                continue
+        return None
+
+    @staticmethod
+    def _adicionar_data_e_temporada(documento):
+        data_hora = BrasileiraoAPI._data_hora(documento.get("data"), documento.get("hora"))
+        documento["data_hora"] = data_hora
+        documento["season"] = data_hora.year if data_hora else None
+        return documento
+
+    @staticmethod
+    def _adicionar_chaves_times(documento):
+        for lado in ("homeTeam", "awayTeam"):
+            documento[lado]["chave"] = normalizar_time(documento[lado].get("name"))
+        return documento
+
+    @staticmethod
+    def _montar_documento(record):
+        data_hora = record.get("data_hora")
+        if data_hora is None:
+            data_hora = BrasileiraoAPI._data_hora(record.get("data"), record.get("hora"))
+        return {
+            "ID": record.get("ID"),
+            "season": data_hora.year if data_hora else None,
+            "rodada": record.get("rodada"),
+            "data": record.get("data"),
+            "hora": record.get("hora"),
+            "data_hora": data_hora,
+            "homeTeam": {
+                "name": record.get("mandante"),
+                "chave": normalizar_time(record.get("mandante")),
+                "formacao": record.get("formacao_mandante"),
+                "tecnico": record.get("tecnico_mandante"),
+                "estado": record.get("mandante_Estado")
+            },
+            "awayTeam": {
+                "name": record.get("visitante"),
+                "chave": normalizar_time(record.get("visitante")),
+                "formacao": record.get("formacao_visitante"),
+                "tecnico": record.get("tecnico_visitante"),
+                "estado": record.get("visitante_Estado")
+            },
+            "score": {
+                "fullTime": {
+                    "home": int(record.get("mandante_Placar")),
+                    "away": int(record.get("visitante_Placar"))
+                }
+            },
+            "vencedor": record.get("vencedor"),
+            "arena": record.get("arena")
+        }
+
+    @_invalida_cache
+    def migrar_datas_e_temporadas(self, filtro=None, batch_size=1000, collection_name=None):
+        from pymongo import UpdateOne
+
+        # Preenche data_hora (datetime BSON) e season nos documentos antigos que só têm data/hora em texto
+        if filtro is None:
+            filtro = {"$or": [{"data_hora": {"$exists": False}}, {"season": {"$exists": False}}]}
+
+        collection = self.db[collection_name] if collection_name else self.collection
+        # Season nova muda a linha da partida nos agregados (só na collection principal)
+        manter_agregados = collection.full_name == self.collection.full_name
+        adicionados = []
+        removidos = []
+        operacoes = []
+        total = 0
+        for doc in collection.find(filtro, dict(self.PROJECAO_PLACARES, _id=1, data=1, hora=1)):
+            data_hora = self._data_hora(doc.get("data"), doc.get("hora"))
+            season = data_hora.year if data_hora else None
+            operacoes.append(UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {"data_hora": data_hora, "season": season}}
+            ))
+            if manter_agregados and doc.get("season") != season:
+                removidos.append(self._resumo_partida(doc))
+                adicionados.append(self._resumo_partida(dict(doc, season=season)))
+            if len(operacoes) >= batch_size:
+                total += collection.bulk_write(operacoes, ordered=False).modified_count
+                operacoes = []
+        if operacoes:
+            total += collection.bulk_write(operacoes, ordered=False).modified_count
+        self._aplicar_resumos(adicionados, removidos)
+
+        print(f"Atualizados {total} documentos com data_hora e season.")
+        return total
+
+    @_invalida_cache
+    def migrar_chaves_times(self, batch_size=1000):
+        from pymongo import UpdateOne
+
+        # Grava homeTeam.chave / awayTeam.chave (nome canônico indexado) nos documentos que ainda não têm
+        filtro = {"$or": [{"homeTeam.chave": {"$exists": False}}, {"awayTeam.chave": {"$exists": False}}]}
+        operacoes = []
+        total = 0
+        for doc in self.collection.find(filtro, {"homeTeam.name": 1, "awayTeam.name": 1}):
+            operacoes.append(UpdateOne({"_id": doc["_id"]}, {"$set": {
+                "homeTeam.chave": normalizar_time(doc.get("homeTeam", {}).get("name")),
+                "awayTeam.chave": normalizar_time(doc.get("awayTeam", {}).get("name"))
+            }}))
+            if len(operacoes) >= batch_size:
+                total += self.collection.bulk_write(operacoes, ordered=False).modified_count
+                operacoes = []
+        if operacoes:
+            total += self.collection.bulk_write(operacoes, ordered=False).modified_count
+
+        print(f"Atualizados {total} documentos com a chave canônica dos times.")
+        return total
+
+    @_invalida_cache
     def limpar_colecao(self):
-        resultado = self.collection.delete_many({})
-        print(f"Removidos {resultado.deleted_count} documentos.")
-        return resultado.deleted_count
+        removidos = self._remover_partidas_em_lotes({})
+        print(f"Removidos {removidos} documentos.")
+        return removidos
+
+    def ensure_indexes(self):
+        # create_index é idempotente: índices já existentes com a mesma definição são mantidos
+        criados = {}
+        for nome in self.INDICES:
+            collection = self.collection if nome == "partidas" else self.db[nome]
+            especificacoes = self._especificacoes_indices(collection.name)
+            self._verificar_unicidade(collection, especificacoes)
+            if nome == "partidas":
+                sem_chave = collection.count_documents({"homeTeam.chave": {"$exists": False}})
+                if sem_chave:
+                    print(f"Aviso: {sem_chave} partidas sem a chave canônica dos times; os confrontos delas "
+                          f"só casam pelo nome exato (veja migrar_chaves_times).")
+            criados[collection.name] = []
+            for especificacao in especificacoes:
+                opcoes = dict(especificacao)
+                chaves = opcoes.pop("keys")
+                criados[collection.name].append(collection.create_index(chaves, **opcoes))
+            print(f"Índices garantidos em '{collection.name}': {', '.join(criados[collection.name])}")
+        return criados
+
+    def _especificacoes_indices(self, collection_name):
+        # Índices de INDICES para a collection, já ajustados ao backend
+        nome = "partidas" if collection_name == self.collection_name else collection_name
+        return [self.backend.opcoes_indice(dict(especificacao)) for especificacao in self.INDICES.get(nome, [])]
+
+    def _verificar_unicidade(self, collection, especificacoes, nome=None, limite=10):
+        # Antes de criar um índice único, procura chaves repetidas (ex.: tabelas inseridas várias vezes
+        # pelas versões antigas) e falha com as chaves em conflito em vez de um DuplicateKeyError
+        existentes = collection.index_information()
+        for especificacao in especificacoes:
+            if not especificacao.get("unique") or especificacao["name"] in existentes:
+                continue
+            campos = [campo for campo, _ in especificacao["keys"]]
+            pipeline = []
+            if "partialFilterExpression" in especificacao:
+                pipeline.append({"$match": especificacao["partialFilterExpression"]})
+            pipeline += [
+                {"$group": {"_id": {f"c{i}": f"${campo}" for i, campo in enumerate(campos)}, "total": {"$sum": 1}}},
+                {"$match": {"total": {"$gt": 1}}},
+                {"$limit": limite}
+            ]
+            repetidas = [
+                (tuple(grupo["_id"].get(f"c{i}") for i in range(len(campos))), grupo["total"])
+                for grupo in collection.aggregate(pipeline)
+            ]
+            if repetidas:
+                descricao = ", ".join(f"{chave} ({total}x)" for chave, total in repetidas)
+                raise ValueError(f"Índice único '{especificacao['name']}' não pode ser criado em "
+                                 f"'{nome or collection.name}': valores repetidos de {', '.join(campos)}: {descricao}")
+
+    def explain(self, nome_time="Flamengo", adversario="Fluminense"):
+        # Consultas representativas de cada método; aponta as que ainda fazem COLLSCAN
+        if not self.backend.suporta_explain:
+            raise NotImplementedError(f"explain não é suportado pelo backend '{self.backend.nome}'")
+        odds = self.db["odds_times_aggregados"]
+        consultas = [
+            ("obter_partidas_time", self.collection, self._filtro_partidas_time(nome_time)),
+            ("buscar_partidas_por_confronto", self.collection, self._filtro_confronto(nome_time, adversario)),
+            ("buscar_partidas_por_time_or", self.collection, self._filtro_time_or(nome_time, adversario)),
+            ("buscar_partidas_por_rodadas", self.collection, {"rodada": {"$in": [1, 2]}}),
+            ("montar_tabelas", self.collection, {"season": {"$gte": 2003, "$lte": 2022}}),
+            ("importar_json_com_upsert", self.collection, {"ID": 1, "season": 2003}),
+            ("verificar_e_inserir_documentos", self.collection, self._criterio_existencia("brasileirao", {
+                "rodada": 1, "data": "15/04/2024",
+                "homeTeam": {"name": nome_time}, "awayTeam": {"name": adversario}
+            })),
+            ("verificar_e_inserir_documentos", odds, self._criterio_existencia("odds_times_aggregados", {
+                "time": nome_time, "season": 2024
+            })),
+            ("plot_desempenho_time", odds, {"time": nome_time})
+        ]
+
+        relatorio = []
+        for metodo, collection, filtro in consultas:
+            plano = collection.find(filtro).explain()["queryPlanner"]["winningPlan"]
+            estagios = self._estagios_plano(plano)
+            relatorio.append({
+                "metodo": metodo,
+                "colecao": collection.name,
+                "estagios": estagios,
+                "collscan": "COLLSCAN" in estagios
+            })
+
+        print("Plano de execução das consultas:")
+        for item in relatorio:
+            alerta = "  <-- COLLSCAN" if item["collscan"] else ""
+            print(f"- {item['metodo']} ({item['colecao']}): {' > '.join(item['estagios'])}{alerta}")
+        return relatorio
+
+    @staticmethod
+    def _estagios_plano(plano):
+        # Percorre a árvore do winningPlan (inputStage / inputStages / queryPlan)
+        estagios = []
+        pendentes = [plano]
+        while pendentes:
+            estagio = pendentes.pop(0)
+            if "queryPlan" in estagio:
+                estagio = estagio["queryPlan"]
+            if "stage" in estagio:
+                estagios.append(estagio["stage"])
+            if "inputStage" in estagio:
+                pendentes.append(estagio["inputStage"])
+            pendentes.extend(estagio.get("inputStages", []))
+        return estagios
     
             
-    def consultar_dados_mongodb(self, filtro=None):
-        if filtro:
-            dados = list(self.collection.find(filtro))
-        else:
-            dados = list(self.collection.find())
-        return pd.DataFrame(dados)
-    
-    def obter_partidas_time(self, nome_time):
-        query = {
-            "$or": [
-                {"homeTeam.name": nome_time},
-                {"awayTeam.name": nome_time}
-            ]
-        }
-        return self.consultar_dados_mongodb(query)
-    def consultar_dados_mongodb(self, filtro=None):
-        if filtro:
-            dados = list(self.collection.find(filtro))
-        else:
-            dados = list(self.collection.find())
-        df = pd.DataFrame(dados)
-        return df
+    def consultar_dados_mongodb(self, filtro=None, projecao=None, batch_size=None, ordenacao=None, limite=None):
+        import pandas as pd
+
+        cursor = self.collection.find(filtro or {}, projecao)
+        if ordenacao:
+            cursor = cursor.sort(ordenacao)
+        if limite:
+            cursor = cursor.limit(limite)
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+        return pd.DataFrame(list(cursor))
     
-    def obter_partidas_time(self, nome_time):
-        query = {
+    def iter_documentos(self, filtro=None, projecao=None, batch_size=None, ordenacao=None, collection_name=None):
+        # Gera os documentos direto do cursor: memória limitada ao lote e processamento desde o primeiro lote
+        collection = self.db[collection_name] if collection_name else self.collection
+        cursor = collection.find(filtro or {}, projecao).batch_size(batch_size or self.BATCH_SIZE_CURSOR)
+        if ordenacao:
+            cursor = cursor.sort(ordenacao)
+        try:
+            yield from cursor
+        finally:
+            # Libera o cursor no servidor mesmo se o consumidor parar antes do fim
+            cursor.close()
+
+    def iter_dataframes(self, filtro=None, projecao=None, batch_size=None, ordenacao=None, collection_name=None):
+        from itertools import islice
+
+        import pandas as pd
+
+        batch_size = batch_size or self.BATCH_SIZE_CURSOR
+        documentos = self.iter_documentos(filtro, projecao, batch_size, ordenacao, collection_name)
+        while True:
+            lote = list(islice(documentos, batch_size))
+            if not lote:
+                return
+            yield pd.DataFrame(lote)
+
+    def obter_partidas_time(self, nome_time, projecao=None):
+        return self.consultar_dados_mongodb(filtro=self._filtro_partidas_time(nome_time), projecao=projecao)
+
+    @staticmethod
+    def _filtro_partidas_time(nome_time):
+        return {
             "$or": [
                 {"homeTeam.name": nome_time},
                 {"awayTeam.name": nome_time}
             ]
         }
-        return self.consultar_dados_mongodb(filtro=query)
     
     def calcular_resultado(self, row, time):
         if row['homeTeam']['name'] == time:
@@ -108,13 +635,8 @@ class BrasileiraoAPI:
                 return 'Empate'
     
     def plot_bar(self, resultados, time):
-        plt.figure(figsize=(8,6))
-        resultados.plot(kind='bar', color=['green', 'red', 'grey'])
-        plt.title(f'Resultados do {time} no Brasileirão 2023')
-        plt.xlabel('Resultado')
-        plt.ylabel('Número de Partidas')
-        plt.xticks(rotation=0)
-        plt.show()
+        import brasileirao_plots
+        brasileirao_plots.plot_bar(resultados, time)
     
     def verificar_time_na_competicao(self, competicao_id, nome_time):
         dados_times = self.obter_times_competicao(competicao_id)
@@ -130,162 +652,214 @@ class BrasileiraoAPI:
             print("Não foi possível obter a lista de times da competição.")
             return False
         
+    def carregar_partidas_planas(self, filtro=None):
+        import pandas as pd
+
+        # O $project achata homeTeam/awayTeam/score no servidor; nenhum dict aninhado chega ao pandas
+        pipeline = []
+        if filtro:
+            pipeline.append({"$match": filtro})
+        pipeline.append({"$project": {
+            "_id": 0,
+            "season": 1,
+            "rodada": 1,
+            "data_hora": 1,
+            "home": "$homeTeam.name",
+            "away": "$awayTeam.name",
+            "home_goals": "$score.fullTime.home",
+            "away_goals": "$score.fullTime.away"
+        }})
+        cursor = self.collection.aggregate(pipeline, batchSize=self.BATCH_SIZE_CURSOR)
+        df = pd.DataFrame(list(cursor), columns=list(self.COLUNAS_PLANAS))
+        return self._tipar_partidas(df)
+
+    @_cache_resultado
+    def carregar_match_store(self, filtro=None):
+        # Uma única leitura do histórico; as consultas seguintes rodam em memória, sem ida ao MongoDB
+        from match_store import MatchStore
+        return MatchStore.de_dataframe(self.carregar_partidas_planas(filtro))
+
+    def gerar_matriz_confrontos(self, output_path="../../data/matriz_confrontos.npz"):
+        from match_store import MatrizConfrontos
+        matriz = MatrizConfrontos.de_match_store(self.carregar_match_store())
+        matriz.salvar(output_path)
+        print(f"Matriz de confrontos ({len(matriz.chaves)} times, {len(matriz.temporadas)} temporadas) salva em: {output_path}")
+        return matriz
+
+    @staticmethod
+    def carregar_matriz_confrontos(path="../../data/matriz_confrontos.npz"):
+        from match_store import MatrizConfrontos
+        return MatrizConfrontos.carregar(path)
+
+    def exportar_snapshot_colunar(self, diretorio="../../data/snapshot_colunar"):
+        # Partidas, tabelas_aggregadas e odds_times_aggregados em arrays .npy que abrem com mmap;
+        # todos os nomes de times vêm de um único dicionário (times.json) e as colunas guardam o código
+        import os
+
+        import numpy as np
+        from match_store import MatchStore
+
+        inicio = perf_counter()
+        store = self.carregar_match_store()
+        # Contadores ausentes (ex.: linhas de odds inseridas à mão, sem gols e pontos) entram como 0
+        tabelas = [
+            (int(doc["season"]), time, [valores.get(estatistica, 0) for estatistica in self.ESTATISTICAS])
+            for doc in self.db["tabelas_aggregadas"].find({}, {"_id": 0}).sort("season", 1)
+            for time, valores in doc.get("tabela", {}).items()
+        ]
+        odds = []
+        incompletas = 0
+        for doc in self.db["odds_times_aggregados"].find({}, {"_id": 0}).sort("season", 1):
+            if doc.get("time") is None or doc.get("season") is None or \
+                    any(chave not in doc.get("odds", {}) for chave in self.CHAVES_ODDS):
+                incompletas += 1
+                continue
+            odds.append(doc)
+        if incompletas:
+            print(f"Ignoradas {incompletas} linhas de odds sem time, season ou odds.")
+
+        # Times que só aparecem nas coleções agregadas entram no fim, sem mudar os códigos das partidas
+        times = list(store.times)
+        conhecidos = set(times)
+        for time in [time for _, time, _ in tabelas] + [doc["time"] for doc in odds]:
+            if time not in conhecidos:
+                conhecidos.add(time)
+                times.append(time)
+        codigos = {time: i for i, time in enumerate(times)}
+
+        MatchStore(times, **{coluna: getattr(store, coluna) for coluna in MatchStore.COLUNAS}).salvar(diretorio)
+        colunas = {
+            "tabelas_season": np.array([season for season, _, _ in tabelas], dtype=np.int16),
+            "tabelas_time": np.array([codigos[time] for _, time, _ in tabelas], dtype=np.int32),
+            "tabelas_estatisticas": np.array([valores for _, _, valores in tabelas], dtype=np.int32)
+                                      .reshape(-1, len(self.ESTATISTICAS)),
+            "odds_season": np.array([doc["season"] for doc in odds], dtype=np.int16),
+            "odds_time": np.array([codigos[doc["time"]] for doc in odds], dtype=np.int32),
+            "odds_estatisticas": np.array([[doc.get(e, 0) for e in self.ESTATISTICAS] for doc in odds], dtype=np.int32)
+                                   .reshape(-1, len(self.ESTATISTICAS)),
+            "odds_odds": np.array([[doc["odds"][chave] for chave in self.CHAVES_ODDS] for doc in odds], dtype=np.float64)
+                           .reshape(-1, len(self.CHAVES_ODDS))
+        }
+        for nome, valores in colunas.items():
+            np.save(os.path.join(diretorio, f"{nome}.npy"), valores)
+
+        print(f"Snapshot colunar ({len(store)} partidas, {len(tabelas)} linhas de tabela, {len(odds)} odds) "
+              f"salvo em: {diretorio} ({perf_counter() - inicio:.2f}s)")
+        return diretorio
+
+    @classmethod
+    def carregar_snapshot_colunar(cls, diretorio="../../data/snapshot_colunar", mmap_mode="r"):
+        import os
+
+        import numpy as np
+        import pandas as pd
+        from match_store import MatchStore
+
+        store = MatchStore.carregar(diretorio, mmap_mode)
+        categorias = pd.CategoricalDtype(store.times)
+
+        def carregar(nome):
+            return np.load(os.path.join(diretorio, f"{nome}.npy"), mmap_mode=mmap_mode)
+
+        def tabela(prefixo, colunas):
+            dados = {
+                "season": carregar(f"{prefixo}_season"),
+                "time": pd.Categorical.from_codes(carregar(f"{prefixo}_time"), dtype=categorias)
+            }
+            dados.update(colunas)
+            return pd.DataFrame(dados, copy=False)
+
+        estatisticas = carregar("tabelas_estatisticas")
+        tabelas = tabela("tabelas", {e: estatisticas[:, i] for i, e in enumerate(cls.ESTATISTICAS)})
+        estatisticas = carregar("odds_estatisticas")
+        odds = carregar("odds_odds")
+        colunas = {e: estatisticas[:, i] for i, e in enumerate(cls.ESTATISTICAS)}
+        colunas.update({chave: odds[:, i] for i, chave in enumerate(cls.CHAVES_ODDS)})
+        return {"partidas": store, "tabelas": tabelas, "odds": tabela("odds", colunas)}
+
+    @classmethod
+    def _tipar_partidas(cls, df):
+        import pandas as pd
+
+        obrigatorias = ["season", "rodada", "home", "away", "home_goals", "away_goals"]
+        incompletas = df[obrigatorias].isna().any(axis=1)
+        if incompletas.any():
+            print(f"Ignoradas {int(incompletas.sum())} partidas sem season ou placar (veja migrar_datas_e_temporadas).")
+            df = df[~incompletas]
+
+        # Mandante e visitante compartilham as mesmas categorias, então os códigos são comparáveis
+        times = sorted(pd.unique(pd.concat([df["home"], df["away"]])))
+        tipos = dict(cls.COLUNAS_PLANAS)
+        tipos["home"] = tipos["away"] = pd.CategoricalDtype(times)
+        return df.astype(tipos).reset_index(drop=True)
+
+    @_cache_resultado
     def obter_todos_times(self):
-        dados = list(self.collection.find())
-        df = pd.DataFrame(dados)
-        
-        times_home = []
-        times_away = []
-        
-        if 'homeTeam' in df.columns:
-            times_home = df['homeTeam'].apply(lambda t: t.get('name') if isinstance(t, dict) else t)
-        
-        if 'awayTeam' in df.columns:
-            times_away = df['awayTeam'].apply(lambda t: t.get('name') if isinstance(t, dict) else t)
-        
-        todos_times = pd.unique(list(times_home) + list(times_away))
-        return sorted(todos_times)  # Retorna ordenado alfabeticamente
+        # A lista de times não depende de season nem de placar: distinct servido pelos índices de mandante/visitante
+        times = set(self.collection.distinct("homeTeam.name")) | set(self.collection.distinct("awayTeam.name"))
+        times.discard(None)
+        return sorted(times)  # Retorna ordenado alfabeticamente
     
    
     def plot_desempenho_temporada(self, nome_time):
-        partidas = self.obter_partidas_time(nome_time)
-        
-        partidas['utcDate'] = pd.to_datetime(partidas['utcDate'], errors='coerce')
-        partidas = partidas.sort_values('utcDate')
-        
-        partidas['gols_marcados'] = partidas.apply(
-            lambda row: row['score']['fullTime']['home']
-                        if isinstance(row.get('homeTeam'), dict) and row['homeTeam'].get('name') == nome_time 
-                        else row['score']['fullTime']['away'],
-            axis=1
-        )
-        
-        partidas['gols_sofridos'] = partidas.apply(
-            lambda row: row['score']['fullTime']['away']
-                        if isinstance(row.get('homeTeam'), dict) and row['homeTeam'].get('name') == nome_time 
-                        else row['score']['fullTime']['home'],
-            axis=1
-        )
-        
-        # Configuração do scatter plot
-        plt.figure(figsize=(12,6))
-        total_gols = partidas['gols_marcados'] + partidas['gols_sofridos']
-        plt.scatter(partidas['utcDate'], partidas['gols_marcados'], 
-                    s=total_gols*100, alpha=0.6, label='Gols Marcados')
-        plt.scatter(partidas['utcDate'], partidas['gols_sofridos'], 
-                    s=total_gols*100, alpha=0.6, label='Gols Sofridos')
-        
-        plt.title(f'Desempenho do {nome_time} na Temporada')
-        plt.xlabel('Data')
-        plt.ylabel('Número de Gols')
-        plt.legend()
-        plt.grid(True, alpha=0.3)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.show()
-        
-        partidas = self.obter_partidas_time(nome_time)
-        
-        partidas['utcDate'] = pd.to_datetime(partidas['utcDate'])
-        partidas = partidas.sort_values('utcDate')
-        
-        partidas['gols_marcados'] = partidas.apply(
-            lambda row: row['score']['fullTime']['home'] 
-            if row['homeTeam']['name'] == nome_time 
-            else row['score']['fullTime']['away'], 
-            axis=1
-        )
-        
-        partidas['gols_sofridos'] = partidas.apply(
-            lambda row: row['score']['fullTime']['away'] 
-            if row['homeTeam']['name'] == nome_time 
-            else row['score']['fullTime']['home'], 
-            axis=1
-        )
-        
+        import brasileirao_plots
+        brasileirao_plots.plot_desempenho_temporada(self, nome_time)
 
-        plt.figure(figsize=(12, 6))
-        
-        total_gols = partidas['gols_marcados'] + partidas['gols_sofridos']
-        plt.scatter(partidas['utcDate'], partidas['gols_marcados'], 
-                    s=total_gols*100, alpha=0.6, label='Gols Marcados')
-        plt.scatter(partidas['utcDate'], partidas['gols_sofridos'], 
-                    s=total_gols*100, alpha=0.6, label='Gols Sofridos')
-        
-        plt.title(f'Desempenho do {nome_time} na Temporada')
-        plt.xlabel('Data')
-        plt.ylabel('Número de Gols')
-        plt.legend()
-        plt.grid(True, alpha=0.3)
-        
-        plt.xticks(rotation=45)
-        
-        plt.tight_layout()
-        plt.show()
-        
+    @_cache_resultado
+    def montar_tabelas(self, start_year=2003, end_year=2022):
+        partidas = self.carregar_partidas_planas({"season": {"$gte": start_year, "$lte": end_year}})
+        tabelas = self.calcular_tabelas(partidas, start_year, end_year)
+        return json.dumps(tabelas, indent=4, ensure_ascii=False)
 
-    def consultar_dados_mongodb(self, filtro=None):
-        if filtro:
-            dados = list(self.collection.find(filtro))
-        else:
-            dados = list(self.collection.find())
-        df = pd.DataFrame(dados)
-        return df
+    @classmethod
+    def calcular_tabelas(cls, partidas, start_year=2003, end_year=2022):
+        partidas = partidas[(partidas["season"] >= start_year) & (partidas["season"] <= end_year)]
+        longa = cls._tabela_longa(partidas)
+        totais = longa.groupby(["season", "time"], sort=False)[cls.ESTATISTICAS].sum()
 
-    def montar_tabelas(self, start_year=2003, end_year=2022):
-        df = self.consultar_dados_mongodb()
-        df["data_dt"] = pd.to_datetime(df["data"], format="%d/%m/%Y", errors="coerce")
-        df = df.dropna(subset=["data_dt"])
-        df = df[(df["data_dt"].dt.year >= start_year) & (df["data_dt"].dt.year <= end_year)]
-        
         tabelas = {}
         for season in range(start_year, end_year + 1):
             tabelas[str(season)] = {}
 
-        def atualizar_time(tabela, time, gols_feitos, gols_sofridos, resultado):
-            if time not in tabela:
-                tabela[time] = {
-                    "jogos": 0,
-                    "vitorias": 0,
-                    "empates": 0,
-                    "derrotas": 0,
-                    "gols_marcados": 0,
-                    "gols_sofridos": 0,
-                    "pontos": 0
-                }
-            tabela[time]["jogos"] += 1
-            tabela[time]["gols_marcados"] += gols_feitos
-            tabela[time]["gols_sofridos"] += gols_sofridos
-            if resultado == "Vitória":
-                tabela[time]["vitorias"] += 1
-                tabela[time]["pontos"] += 3
-            elif resultado == "Empate":
-                tabela[time]["empates"] += 1
-                tabela[time]["pontos"] += 1
-            elif resultado == "Derrota":
-                tabela[time]["derrotas"] += 1
-
-        for _, row in df.iterrows():
-            season = str(row["data_dt"].year)
-            home_team = row["homeTeam"]["name"] if isinstance(row["homeTeam"], dict) else row["homeTeam"]
-            away_team = row["awayTeam"]["name"] if isinstance(row["awayTeam"], dict) else row["awayTeam"]
-            score_home = row["score"]["fullTime"]["home"]
-            score_away = row["score"]["fullTime"]["away"]
-
-            if score_home > score_away:
-                resultado_home = "Vitória"
-                resultado_away = "Derrota"
-            elif score_home < score_away:
-                resultado_home = "Derrota"
-                resultado_away = "Vitória"
-            else:
-                resultado_home = "Empate"
-                resultado_away = "Empate"
-            
-            atualizar_time(tabelas[season], home_team, score_home, score_away, resultado_home)
-            atualizar_time(tabelas[season], away_team, score_away, score_home, resultado_away)
-        
-        return json.dumps(tabelas, indent=4, ensure_ascii=False)
+        # sort=False mantém a ordem de primeira aparição, a mesma do antigo loop por partida
+        times = partidas["home"].cat.categories
+        for (season, codigo), valores in zip(totais.index, totais.to_numpy().tolist()):
+            tabelas[str(season)][times[codigo]] = dict(zip(cls.ESTATISTICAS, valores))
+        return tabelas
+
+    @staticmethod
+    def _tabela_longa(partidas):
+        import numpy as np
+        import pandas as pd
+
+        # Uma linha por time em cada partida: a linha 2i é o mandante e a 2i+1 o visitante da partida i
+        n = len(partidas)
+        home_goals = partidas["home_goals"].to_numpy(dtype=np.int64)
+        away_goals = partidas["away_goals"].to_numpy(dtype=np.int64)
+
+        time = np.empty(2 * n, dtype=np.int32)
+        time[0::2] = partidas["home"].cat.codes.to_numpy()
+        time[1::2] = partidas["away"].cat.codes.to_numpy()
+        gols_marcados = np.empty(2 * n, dtype=np.int64)
+        gols_marcados[0::2] = home_goals
+        gols_marcados[1::2] = away_goals
+        gols_sofridos = np.empty(2 * n, dtype=np.int64)
+        gols_sofridos[0::2] = away_goals
+        gols_sofridos[1::2] = home_goals
+
+        vitorias = gols_marcados > gols_sofridos
+        empates = gols_marcados == gols_sofridos
+        return pd.DataFrame({
+            "season": np.repeat(partidas["season"].to_numpy(), 2),
+            "time": time,
+            "jogos": np.ones(2 * n, dtype=np.int64),
+            "vitorias": vitorias.astype(np.int64),
+            "empates": empates.astype(np.int64),
+            "derrotas": (gols_marcados < gols_sofridos).astype(np.int64),
+            "gols_marcados": gols_marcados,
+            "gols_sofridos": gols_sofridos,
+            "pontos": 3 * vitorias + empates
+        })
     
     def exportar_tabelas_json(self, start_year=2003, end_year=2022, output_path="../../data/tabelas_aggregadas.json"):
         tabelas_json = self.montar_tabelas(start_year, end_year)
@@ -294,115 +868,122 @@ class BrasileiraoAPI:
         print(f"Arquivo JSON com as tabelas criado em: {output_path}")
         return output_path
 
-    def inserir_tabelas_no_mongodb(self, start_year=2003, end_year=2022, collection_name="tabelas_aggregadas"):
-        import json
-        tabelas_json = self.montar_tabelas(start_year, end_year)
-        tabelas_dict = json.loads(tabelas_json)
-        
+    @_invalida_cache
+    def inserir_tabelas_no_mongodb(self, start_year=2003, end_year=2022, collection_name="tabelas_aggregadas",
+                                   no_servidor=False):
+        from pymongo import ReplaceOne
+
+        if no_servidor and not self.backend.suporta_merge:
+            raise NotImplementedError(f"$merge (no_servidor=True) não é suportado pelo backend '{self.backend.nome}'")
+
         nova_colecao = self.db[collection_name]
+        # season é a chave das tabelas: a carga substitui a temporada em vez de duplicá-la.
+        # As versões antigas duplicavam as temporadas a cada carga; antes do índice único fica só a mais recente
+        if "season" not in nova_colecao.index_information():
+            self._remover_temporadas_duplicadas(nova_colecao)
+        nova_colecao.create_index("season", name="season", unique=True)
+
+        if no_servidor:
+            # O $merge grava direto em collection_name; nenhuma tabela trafega pela rede
+            pipeline = self._pipeline_tabelas(start_year, end_year) + [{
+                "$merge": {
+                    "into": collection_name,
+                    "on": "season",
+                    "whenMatched": "replace",
+                    "whenNotMatched": "insert"
+                }
+            }]
+            self.collection.aggregate(pipeline)
+            print(f"Tabelas de {start_year} a {end_year} gravadas no servidor na coleção '{collection_name}'.")
+            return
+
+        tabelas_dict = json.loads(self.montar_tabelas(start_year, end_year))
         
-        documentos = []
+        operacoes = []
         for season, tabela in tabelas_dict.items():
             documento = {
                 "season": season,
                 "tabela": tabela
             }
-            documentos.append(documento)
+            operacoes.append(ReplaceOne({"season": season}, documento, upsert=True))
         
-        if documentos:
-            nova_colecao.insert_many(documentos)
-            print(f"Inseridos {len(documentos)} documentos na coleção '{collection_name}'.")
+        if operacoes:
+            nova_colecao.bulk_write(operacoes, ordered=False)
+            print(f"Inseridos {len(operacoes)} documentos na coleção '{collection_name}'.")
         else:
             print("Nenhum documento para inserir.")
-            
-    
-  
+
+    @staticmethod
+    def _remover_temporadas_duplicadas(collection):
+        repetidas = list(collection.aggregate([
+            {"$sort": {"_id": 1}},
+            {"$group": {"_id": "$season", "ids": {"$push": "$_id"}}},
+            {"$match": {"ids.1": {"$exists": True}}}
+        ]))
+        if not repetidas:
+            return 0
+        # O ObjectId cresce com a inserção: o último da lista é o documento mais recente
+        removidos = collection.delete_many({"_id": {"$in": [_id for grupo in repetidas for _id in grupo["ids"][:-1]]}})
+        print(f"Removidas {removidos.deleted_count} tabelas duplicadas de '{collection.name}' "
+              f"(temporadas {', '.join(str(grupo['_id']) for grupo in repetidas)}).")
+        return removidos.deleted_count
+
+    @_cache_resultado
+    def montar_tabelas_no_servidor(self, start_year=2003, end_year=2022):
+        # Mesmo cálculo de montar_tabelas, mas feito inteiro pelo MongoDB; só as tabelas prontas voltam
+        documentos = self.collection.aggregate(self._pipeline_tabelas(start_year, end_year))
+        return {doc["season"]: doc["tabela"] for doc in documentos}
+
+    def _pipeline_tabelas(self, start_year, end_year):
+        def perspectiva(lado, adversario):
+            gols = f"$score.fullTime.{lado}"
+            gols_adversario = f"$score.fullTime.{adversario}"
+            return [{"$group": {
+                "_id": {"season": "$season", "time": f"${lado}Team.name"},
+                "jogos": {"$sum": 1},
+                "vitorias": {"$sum": {"$cond": [{"$gt": [gols, gols_adversario]}, 1, 0]}},
+                "empates": {"$sum": {"$cond": [{"$eq": [gols, gols_adversario]}, 1, 0]}},
+                "derrotas": {"$sum": {"$cond": [{"$lt": [gols, gols_adversario]}, 1, 0]}},
+                "gols_marcados": {"$sum": gols},
+                "gols_sofridos": {"$sum": gols_adversario}
+            }}]
+
+        estatisticas = [e for e in self.ESTATISTICAS if e != "pontos"]
+        return [
+            {"$match": {"season": {"$gte": start_year, "$lte": end_year}}},
+            {"$facet": {
+                "mandantes": perspectiva("home", "away"),
+                "visitantes": perspectiva("away", "home")
+            }},
+            {"$project": {"linhas": {"$concatArrays": ["$mandantes", "$visitantes"]}}},
+            {"$unwind": "$linhas"},
+            {"$replaceRoot": {"newRoot": "$linhas"}},
+            {"$group": dict({"_id": "$_id"}, **{e: {"$sum": f"${e}"} for e in estatisticas})},
+            {"$addFields": {"pontos": {"$add": [{"$multiply": [3, "$vitorias"]}, "$empates"]}}},
+            {"$sort": {"_id.season": 1, "pontos": -1, "_id.time": 1}},
+            {"$group": {
+                "_id": "$_id.season",
+                "tabela": {"$push": {"k": "$_id.time", "v": {e: f"${e}" for e in self.ESTATISTICAS}}}
+            }},
+            {"$project": {"_id": 0, "season": {"$toString": "$_id"}, "tabela": {"$arrayToObject": "$tabela"}}},
+            {"$sort": {"season": 1}}
+        ]
+        
+    @_invalida_cache
     def gerar_odds_todos_times(self, start_year=2003, end_year=2022,
                           collection_name="odds_times_aggregados",
                           output_path="../../data/odds_times_aggregados.json"):
-        import json
-        import pandas as pd
-        
-        df = self.consultar_dados_mongodb()
-        df["data_dt"] = pd.to_datetime(df["data"], format="%d/%m/%Y", errors="coerce")
-        df = df.dropna(subset=["data_dt"])
-        
-        odds_list = []
-        
-        for season in range(start_year, end_year + 1):
-            df_season = df[df["data_dt"].dt.year == season]
-            if df_season.empty:
-                continue
-            
-            times_home = df_season["homeTeam"].apply(lambda t: t.get("name") if isinstance(t, dict) else t)
-            times_away = df_season["awayTeam"].apply(lambda t: t.get("name") if isinstance(t, dict) else t)
-            unique_times = pd.unique(list(times_home) + list(times_away))
-            
-            for time in unique_times:
-                dados = {
-                    "time": time,
-                    "season": season,
-                    "jogos": 0,
-                    "vitorias": 0,
-                    "empates": 0,
-                    "derrotas": 0,
-                    "gols_marcados": 0,
-                    "gols_sofridos": 0,
-                    "pontos": 0,
-                    "odds": {
-                        "homeWin": None,  
-                        "draw": None,    
-                        "awayWin": None  
-                    }
-                }
-                
-                df_team = df_season[
-                    (df_season["homeTeam"].apply(lambda t: t.get("name") if isinstance(t, dict) else t) == time) |
-                    (df_season["awayTeam"].apply(lambda t: t.get("name") if isinstance(t, dict) else t) == time)
-                ]
-                
-                for _, row in df_team.iterrows():
-                    dados["jogos"] += 1
-                    
-                    home_team = row["homeTeam"].get("name") if isinstance(row["homeTeam"], dict) else row["homeTeam"]
-                    away_team = row["awayTeam"].get("name") if isinstance(row["awayTeam"], dict) else row["awayTeam"]
-                    score_home = row["score"]["fullTime"]["home"]
-                    score_away = row["score"]["fullTime"]["away"]
-                    
-                    if home_team == time:
-                        dados["gols_marcados"] += score_home
-                        dados["gols_sofridos"] += score_away
-                        if score_home > score_away:
-                            dados["vitorias"] += 1
-                            dados["pontos"] += 3
-                        elif score_home == score_away:
-                            dados["empates"] += 1
-                            dados["pontos"] += 1
-                        else:
-                            dados["derrotas"] += 1
-                    elif away_team == time:
-                        dados["gols_marcados"] += score_away
-                        dados["gols_sofridos"] += score_home
-                        if score_away > score_home:
-                            dados["vitorias"] += 1
-                            dados["pontos"] += 3
-                        elif score_away == score_home:
-                            dados["empates"] += 1
-                            dados["pontos"] += 1
-                        else:
-                            dados["derrotas"] += 1
-                
-                # Calcula as médias com duas casas decimais
-                if dados["jogos"] > 0:
-                    dados["odds"]["homeWin"] = round(dados["vitorias"] / dados["jogos"], 2)
-                    dados["odds"]["draw"] = round(dados["empates"] / dados["jogos"], 2)
-                    dados["odds"]["awayWin"] = round(dados["derrotas"] / dados["jogos"], 2)
-                
-                odds_list.append(dados)
+        from pymongo import ReplaceOne
+
+        odds_list = self.odds_todos_times(start_year, end_year)
         
         if odds_list:
             nova_colecao = self.db[collection_name]
-            nova_colecao.insert_many(odds_list)
+            # time + season é a chave das odds (também usada por atualizar_agregados): a carga substitui em vez de duplicar
+            nova_colecao.bulk_write([
+                ReplaceOne({"time": odds["time"], "season": odds["season"]}, odds, upsert=True)
+                for odds in odds_list
+            ], ordered=False)
             print(f"Inseridos {len(odds_list)} documentos na coleção '{collection_name}'.")
         
         with open(output_path, "w", encoding="utf-8") as f:
@@ -410,187 +991,271 @@ class BrasileiraoAPI:
         print(f"Arquivo JSON com os odds de cada time criado em: {output_path}")
         
         return odds_list
+
+    @_cache_resultado
+    def odds_todos_times(self, start_year=2003, end_year=2022):
+        partidas = self.carregar_partidas_planas({"season": {"$gte": start_year, "$lte": end_year}})
+        return self.calcular_odds(partidas, start_year, end_year)
+
+    @classmethod
+    def calcular_odds(cls, partidas, start_year=2003, end_year=2022):
+        import numpy as np
+
+        partidas = partidas[(partidas["season"] >= start_year) & (partidas["season"] <= end_year)]
+        longa = cls._tabela_longa(partidas)
+
+        # Mantém a ordem antiga dentro da temporada: primeiro os mandantes, depois quem só jogou fora
+        n = len(partidas)
+        ordem = np.empty(2 * n, dtype=np.int64)
+        ordem[0::2] = np.arange(n)
+        ordem[1::2] = np.arange(n, 2 * n)
+        longa["ordem"] = ordem
+
+        agregacoes = {estatistica: "sum" for estatistica in cls.ESTATISTICAS}
+        agregacoes["ordem"] = "min"
+        totais = longa.groupby(["season", "time"]).agg(agregacoes).sort_values(["season", "ordem"])
+
+        times = partidas["home"].cat.categories
+        odds_list = []
+        for (season, codigo), valores in zip(totais.index, totais[cls.ESTATISTICAS].to_numpy().tolist()):
+            dados = {"time": times[codigo], "season": int(season)}
+            dados.update(zip(cls.ESTATISTICAS, valores))
+            # Calcula as médias com duas casas decimais
+            dados["odds"] = {
+                "homeWin": round(dados["vitorias"] / dados["jogos"], 2),
+                "draw": round(dados["empates"] / dados["jogos"], 2),
+                "awayWin": round(dados["derrotas"] / dados["jogos"], 2)
+            }
+            odds_list.append(dados)
+        return odds_list
         
+    @_invalida_cache
+    def remover_partidas(self, filtro):
+        removidos = self._remover_partidas_em_lotes(filtro)
+        if not removidos:
+            print("Nenhuma partida para remover.")
+            return 0
+        print(f"Removidas {removidos} partidas.")
+        return removidos
+
+    def _remover_partidas_em_lotes(self, filtro, batch_size=1000):
+        # Remove por _id e subtrai dos agregados exatamente as partidas encontradas
+        partidas = [
+            (doc["_id"], self._resumo_partida(doc))
+            for doc in self.collection.find(filtro, dict(self.PROJECAO_PLACARES, _id=1))
+        ]
+        removidos = 0
+        for inicio in range(0, len(partidas), batch_size):
+            ids = [_id for _id, _ in partidas[inicio:inicio + batch_size]]
+            removidos += self.collection.delete_many({"_id": {"$in": ids}}).deleted_count
+        self._aplicar_resumos(removidos=[resumo for _, resumo in partidas])
+        return removidos
+
+    @_invalida_cache
+    def atualizar_agregados(self, adicionadas=(), removidas=(),
+                            tabelas_collection="tabelas_aggregadas", odds_collection="odds_times_aggregados"):
+        # Manutenção incremental: aplica $inc só nas linhas (season, time) das partidas afetadas
+        return self._aplicar_resumos(
+            [self._resumo_partida(partida) for partida in adicionadas],
+            [self._resumo_partida(partida) for partida in removidas],
+            tabelas_collection, odds_collection
+        )
+
+    def _aplicar_resumos(self, adicionados=(), removidos=(),
+                         tabelas_collection="tabelas_aggregadas", odds_collection="odds_times_aggregados"):
+        from pymongo import DeleteOne, UpdateOne
+
+        # adicionados/removidos são resumos de _resumo_partida (None para partidas sem season ou placar)
+        deltas = {}
+        for resumos, sinal in ((adicionados, 1), (removidos, -1)):
+            for resumo in resumos:
+                if resumo is None:
+                    continue
+                season, home, away, home_goals, away_goals = resumo
+                for time, gols_marcados, gols_sofridos in ((home, home_goals, away_goals),
+                                                           (away, away_goals, home_goals)):
+                    delta = deltas.setdefault((season, time), dict.fromkeys(self.ESTATISTICAS, 0))
+                    delta["jogos"] += sinal
+                    delta["gols_marcados"] += sinal * gols_marcados
+                    delta["gols_sofridos"] += sinal * gols_sofridos
+                    if gols_marcados > gols_sofridos:
+                        delta["vitorias"] += sinal
+                        delta["pontos"] += 3 * sinal
+                    elif gols_marcados == gols_sofridos:
+                        delta["empates"] += sinal
+                        delta["pontos"] += sinal
+                    else:
+                        delta["derrotas"] += sinal
+
+        deltas = {chave: delta for chave, delta in deltas.items() if any(delta.values())}
+        if not deltas:
+            return 0
+
+        # tabelas_aggregadas: um documento por temporada, com a season em texto
+        incrementos = {}
+        for (season, time), delta in deltas.items():
+            for estatistica, valor in delta.items():
+                incrementos.setdefault(str(season), {})[f"tabela.{time}.{estatistica}"] = valor
+        tabelas = self.db[tabelas_collection]
+        tabelas.bulk_write([
+            UpdateOne({"season": season}, {"$inc": inc}, upsert=True)
+            for season, inc in incrementos.items()
+        ], ordered=False)
+        remocoes = []
+        for doc in tabelas.find({"season": {"$in": list(incrementos)}}, {"season": 1, "tabela": 1}):
+            vazios = {f"tabela.{time}": "" for time, linha in doc.get("tabela", {}).items() if linha.get("jogos", 0) <= 0}
+            if vazios:
+                remocoes.append(UpdateOne({"_id": doc["_id"]}, {"$unset": vazios}))
+        if remocoes:
+            tabelas.bulk_write(remocoes, ordered=False)
+
+        # odds_times_aggregados: $inc nos contadores e recálculo das odds das linhas tocadas
+        odds = self.db[odds_collection]
+        odds.bulk_write([
+            UpdateOne({"time": time, "season": season}, {"$inc": delta}, upsert=True)
+            for (season, time), delta in deltas.items()
+        ], ordered=False)
+        operacoes = []
+        afetados = odds.find(
+            {"$or": [{"time": time, "season": season} for season, time in deltas]},
+            {"jogos": 1, "vitorias": 1, "empates": 1, "derrotas": 1}
+        )
+        for doc in afetados:
+            jogos = doc.get("jogos", 0)
+            if jogos <= 0:
+                operacoes.append(DeleteOne({"_id": doc["_id"]}))
+                continue
+            operacoes.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"odds": {
+                "homeWin": round(doc.get("vitorias", 0) / jogos, 2),
+                "draw": round(doc.get("empates", 0) / jogos, 2),
+                "awayWin": round(doc.get("derrotas", 0) / jogos, 2)
+            }}}))
+        if operacoes:
+            odds.bulk_write(operacoes, ordered=False)
+
+        print(f"Agregados atualizados para {len(deltas)} linhas (season, time).")
+        return len(deltas)
+
+    @staticmethod
+    def _resumo_partida(partida):
+        # Só os campos que influenciam tabelas e odds
+        if partida is None or partida.get("season") is None:
+            return None
+        try:
+            return (
+                partida["season"],
+                partida["homeTeam"]["name"],
+                partida["awayTeam"]["name"],
+                int(partida["score"]["fullTime"]["home"]),
+                int(partida["score"]["fullTime"]["away"])
+            )
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @_invalida_cache
     def limpar_colecao_por_nome(self, collection_name):
+        if collection_name == self.collection_name:
+            return self.limpar_colecao()
         result = self.db[collection_name].delete_many({})
         print(f"Removidos {result.deleted_count} documentos da coleção '{collection_name}'.")
         return result.deleted_count
     
     
-    def plot_desempenho_time(self, nome_time):
-        import matplotlib.pyplot as plt
-        import numpy as np
+    # Os gráficos ficam em brasileirao_plots, importado só quando algum é pedido
 
-        dados = list(self.db["odds_times_aggregados"].find({"time": nome_time}))
-        if not dados:
-            print(f"Nenhum dado encontrado para o time {nome_time}")
-            return
-
-        # Ordena os dados por temporada para visualização cronológica
-        dados = sorted(dados, key=lambda d: d["season"])
-        
-        temporadas = []
-        medias_desempenho = []
+    def plot_desempenho_time(self, nome_time):
+        import brasileirao_plots
+        brasileirao_plots.plot_desempenho_time(self, nome_time)
 
-        for doc in dados:
-            temporadas.append(doc["season"])
-            odds = doc["odds"]
-            media = np.mean([
-                odds["homeWin"] or 0,
-                odds["draw"] or 0,
-                odds["awayWin"] or 0
-            ])
-            medias_desempenho.append(media)
-
-        plt.figure(figsize=(12, 8))
-        plt.scatter(temporadas, medias_desempenho, s=100, alpha=0.7, c='blue', label=nome_time)
-
-        # Ajusta a reta de regressão (as temporadas são numéricas)
-        coef, intercept = np.polyfit(temporadas, medias_desempenho, 1)
-        x_line = np.linspace(min(temporadas), max(temporadas), 100)
-        y_line = coef * x_line + intercept
-        plt.plot(x_line, y_line, "r--", alpha=0.8, label=f"y = {coef:.2f}x + {intercept:.2f}")
-
-        plt.xlabel("Temporadas")
-        plt.ylabel("Média de Desempenho")
-        plt.title(f"Desempenho do {nome_time} ao longo das Temporadas")
-        plt.xticks(temporadas, rotation=45)
-        plt.legend()
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        plt.show()
-        
- 
     def plot_media_porcentagem_time(self, nome_time):
-        import matplotlib.pyplot as plt
-        import numpy as np
-
-        dados = list(self.db["odds_times_aggregados"].find({"time": nome_time}))
-        if not dados:
-            print(f"Nenhum dado encontrado para o time {nome_time}")
-            return
+        import brasileirao_plots
+        brasileirao_plots.plot_media_porcentagem_time(self, nome_time)
 
-        dados = sorted(dados, key=lambda d: d["season"])
-        
-        temporadas = [doc["season"] for doc in dados]
-        vit_percent = [round((doc["odds"]["homeWin"] or 0) * 100, 2) for doc in dados]
-        emp_percent = [round((doc["odds"]["draw"] or 0) * 100, 2) for doc in dados]
-        der_percent = [round((doc["odds"]["awayWin"] or 0) * 100, 2) for doc in dados]
-        
-        # Configuração do gráfico de barras agrupadas
-        x = np.arange(len(temporadas))
-        largura = 0.25
-    
-        plt.figure(figsize=(12, 8))
-        bars1 = plt.bar(x - largura, vit_percent, width=largura, color='green', label='Vitórias (%)')
-        bars2 = plt.bar(x, emp_percent, width=largura, color='gray', label='Empates (%)')
-        bars3 = plt.bar(x + largura, der_percent, width=largura, color='red', label='Derrotas (%)')
-        
-        plt.xlabel("Temporadas")
-        plt.ylabel("Porcentagem (%)")
-        plt.title(f"Média Percentual de Desempenho do {nome_time} por Temporada")
-        plt.xticks(x, temporadas, rotation=45)
-        
-        # Configura os ticks do eixo y de 5 em 5
-        max_y = max(max(vit_percent), max(emp_percent), max(der_percent))
-        y_max = (int(max_y / 5) + 1) * 5
-        plt.yticks(np.arange(0, y_max+1, 5))
-        
-        # Grid com major e minor ticks
-        plt.minorticks_on()
-        plt.grid(axis='y', which='major', linestyle='-', linewidth=0.5, alpha=0.7)
-        plt.grid(axis='y', which='minor', linestyle='--', linewidth=0.5, alpha=0.5)
-        
+    def exportar_graficos_times(self, diretorio="../../data/graficos", formatos=("png",), times=None,
+                                start_year=2003, end_year=2022, processos=None):
+        import brasileirao_plots
+        return brasileirao_plots.exportar_graficos_times(self, diretorio, formatos, times,
+                                                         start_year, end_year, processos)
 
-        for bars in [bars1, bars2, bars3]:
-            for bar in bars:
-                height = bar.get_height()
-                plt.text(bar.get_x() + bar.get_width()/2.0, height, f'{height:.1f}%', 
-                        ha='center', va='bottom', fontsize=8)
-        
-        plt.legend()
-        plt.tight_layout()
-        plt.show()
- 
     def plot_desempenho_todos_times(self):
+        import brasileirao_plots
+        brasileirao_plots.plot_desempenho_todos_times(self)
+    
+    
+    def buscar_partidas_por_confronto(self, time1, time2):
+        return list(self.iter_partidas_por_confronto(time1, time2))
 
-        import matplotlib.pyplot as plt
-        import numpy as np
+    def iter_partidas_por_confronto(self, time1, time2, batch_size=None):
+        return self.iter_documentos(self._filtro_confronto(time1, time2), batch_size=batch_size)
 
-        docs = list(self.db["odds_times_aggregados"].find())
-        if not docs:
-            print("Nenhum dado encontrado para exibir.")
-            return
+    def buscar_partidas_por_confrontos(self, pares):
+        # Vários confrontos numa única agregação: um $match com todos os pares e um $group por par
+        chaves = {}
+        for time1, time2 in pares:
+            chaves[(time1, time2)] = tuple(sorted((normalizar_time(time1), normalizar_time(time2))))
+        if not chaves:
+            return {}
 
-        teams = sorted(set(doc["time"] for doc in docs))
-        cmap = plt.get_cmap("tab20", len(teams))
-        colors = {team: cmap(i) for i, team in enumerate(teams)}
-
-        plt.figure(figsize=(12, 8))
-        performance_values = [] 
+        filtros = []
+        for par in set(chaves):
+            filtros.extend(self._filtro_confronto(*par)["$or"])
+        # Partidas sem chave (antes de migrar_chaves_times) são agrupadas pelo nome exato
+        mandante = {"$ifNull": ["$homeTeam.chave", "$homeTeam.name"]}
+        visitante = {"$ifNull": ["$awayTeam.chave", "$awayTeam.name"]}
+        mandante_primeiro = {"$lt": [mandante, visitante]}
+        pipeline = [
+            {"$match": {"$or": filtros}},
+            {"$sort": {"data_hora": 1}},
+            {"$group": {
+                "_id": {
+                    "time1": {"$cond": [mandante_primeiro, mandante, visitante]},
+                    "time2": {"$cond": [mandante_primeiro, visitante, mandante]}
+                },
+                "partidas": {"$push": "$$ROOT"}
+            }}
+        ]
+        por_par = {
+            (grupo["_id"]["time1"], grupo["_id"]["time2"]): grupo["partidas"]
+            for grupo in self.collection.aggregate(pipeline)
+        }
+        resultado = {}
+        for par, chave in chaves.items():
+            partidas = por_par.get(chave, [])
+            nomes = tuple(sorted(par))
+            if nomes != chave and nomes in por_par:
+                partidas = sorted(partidas + por_par[nomes], key=lambda doc: doc.get("data_hora") or datetime.min)
+            resultado[par] = partidas
+        return resultado
 
-        # Para cada documento, calcula a performance como pontos / (jogos * 3)
-        for doc in docs:
-            season = int(doc["season"])
-            jogos = doc.get("jogos", 0)
-            pontos = doc.get("pontos", 0)
-            performance = pontos / (jogos * 3) if jogos > 0 else 0
-            performance_values.append(performance)
-            team = doc["time"]
-            plt.scatter(season, performance, color=colors[team], alpha=0.7, s=100)
-
-        # Adiciona uma reta horizontal representando a média geral de performance
-        media_geral = np.mean(performance_values)
-        plt.axhline(y=media_geral, color='black', linestyle='--', linewidth=2, label=f"Média Geral ({media_geral:.2f})")
-
-        # Cria uma legenda sem duplicatas (um item por time)
-        legend_handles = []
-        for team in teams:
-            handle = plt.Line2D([], [], marker='o', linestyle='None',
-                                markersize=8, color=colors[team])
-            legend_handles.append(handle)
-
-        # Adiciona a linha da média geral à legenda
-        legend_handles.append(plt.Line2D([], [], color='black', linestyle='--', linewidth=2))
-        teams.append("Média Geral")
-        
-        plt.legend(legend_handles, teams, bbox_to_anchor=(1.05, 1),
-                loc='upper left', borderaxespad=0.)
-        plt.xlabel("Temporadas")
-        plt.ylabel("Performance (%)")
-        plt.title("Performance dos Times ao longo das Temporadas (Pontos / (Jogos × 3))")
-        
-        # Ajusta o eixo x com as temporadas
-        temporadas = sorted(set(int(doc["season"]) for doc in docs))
-        plt.xticks(temporadas, rotation=45)
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        plt.show()
-    
-    
-    def buscar_partidas_por_confronto(self, time1, time2):
-        query = {
+    @staticmethod
+    def _filtro_confronto(time1, time2):
+        # Igualdade na chave canônica (sem caixa nem acentos), servida pelo índice chave_mandante_visitante
+        chave1 = normalizar_time(time1)
+        chave2 = normalizar_time(time2)
+        return {
             "$or": [
-                {"$and": [
-                    {"homeTeam.name": {"$regex": f"^{time1}$", "$options": "i"}},
-                    {"awayTeam.name": {"$regex": f"^{time2}$", "$options": "i"}}
-                ]},
-                {"$and": [
-                    {"homeTeam.name": {"$regex": f"^{time2}$", "$options": "i"}},
-                    {"awayTeam.name": {"$regex": f"^{time1}$", "$options": "i"}}
-                ]}
+                {"homeTeam.chave": chave1, "awayTeam.chave": chave2},
+                {"homeTeam.chave": chave2, "awayTeam.chave": chave1},
+                # Documentos que migrar_chaves_times ainda não preencheu: igualdade exata no nome,
+                # servida pelo índice mandante_season
+                {"homeTeam.chave": {"$exists": False}, "homeTeam.name": time1, "awayTeam.name": time2},
+                {"homeTeam.chave": {"$exists": False}, "homeTeam.name": time2, "awayTeam.name": time1}
             ]
         }
-        return list(self.collection.find(query))
 
     def buscar_partidas_por_time_or(self, time1, time2):
-        query = {"$or": [{"homeTeam.name": time1}, {"awayTeam.name": time2}]}
-        return list(self.collection.find(query))
+        return list(self.collection.find(self._filtro_time_or(time1, time2)))
+
+    @staticmethod
+    def _filtro_time_or(time1, time2):
+        return {"$or": [{"homeTeam.name": time1}, {"awayTeam.name": time2}]}
 
     def buscar_partidas_por_rodadas(self, rodadas):
+        return list(self.iter_partidas_por_rodadas(rodadas))
 
+    def iter_partidas_por_rodadas(self, rodadas, batch_size=None):
         query = {"rodada": {"$in": rodadas}}
-        return list(self.collection.find(query))
+        return self.iter_documentos(query, batch_size=batch_size)
 
 
     # Métodos de agregação utilizando funções diferentes
@@ -633,37 +1298,29 @@ class BrasileiraoAPI:
         return list(self.collection.aggregate(pipeline))
 
     def estatisticas_vitorias_derrotas_mandantes(self, time1, time2):
-        query = {
-            "$or": [
-                {"$and": [
-                    {"homeTeam.name": {"$regex": f"^{time1}$", "$options": "i"}},
-                    {"awayTeam.name": {"$regex": f"^{time2}$", "$options": "i"}}
-                ]},
-                {"$and": [
-                    {"homeTeam.name": {"$regex": f"^{time2}$", "$options": "i"}},
-                    {"awayTeam.name": {"$regex": f"^{time1}$", "$options": "i"}}
-                ]}
-            ]
-        }
-        partidas = list(self.collection.find(query))
+        partidas = list(self.collection.find(
+            self._filtro_confronto(time1, time2), {"_id": 0, "homeTeam.chave": 1, "homeTeam.name": 1, "vencedor": 1}
+        ))
         
         stats = {
             time1: {"vitorias": 0, "derrotas": 0},
             time2: {"vitorias": 0, "derrotas": 0}
         }
+        chave1 = normalizar_time(time1)
+        chave2 = normalizar_time(time2)
         
         for partida in partidas:
-            home = partida["homeTeam"]["name"]
-            vencedor = partida.get("vencedor", "")
+            home = partida["homeTeam"].get("chave") or normalizar_time(partida["homeTeam"].get("name"))
+            vencedor = normalizar_time(partida.get("vencedor", ""))
             
             # Se o time foi mandante, verifica se venceu ou perdeu
-            if home.lower() == time1.lower():
-                if vencedor.lower() == home.lower():
+            if home == chave1:
+                if vencedor == home:
                     stats[time1]["vitorias"] += 1
                 else:
                     stats[time1]["derrotas"] += 1
-            elif home.lower() == time2.lower():
-                if vencedor.lower() == home.lower():
+            elif home == chave2:
+                if vencedor == home:
                     stats[time2]["vitorias"] += 1
                 else:
                     stats[time2]["derrotas"] += 1
@@ -671,10 +1328,19 @@ class BrasileiraoAPI:
         return stats
 
     
-    def fazer_backup(self, db_name="statistics_futebol", repo_name="brazileirao-data-analysis"):
+    def fazer_backup(self, db_name="statistics_futebol", repo_name="brazileirao-data-analysis", batch_size=None,
+                     formato="json", compressao="gzip", threads=None, incremental=False):
         import json
         import os
+        import textwrap
         from datetime import datetime
+
+        if formato not in ("json", "ndjson"):
+            raise ValueError(f"Formato de backup desconhecido: {formato}")
+        if formato == "ndjson" and compressao not in self.BACKUP_EXTENSOES:
+            raise ValueError(f"Compressão de backup desconhecida: {compressao}")
+        if incremental and formato != "ndjson":
+            raise ValueError("Backups incrementais exigem formato='ndjson'")
         
         # Define o caminho base do backup
         base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../backup"))
@@ -688,25 +1354,26 @@ class BrasileiraoAPI:
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         backup_timestamp_dir = os.path.join(backup_dir, f"{db_name}_backup_{timestamp}")
         os.makedirs(backup_timestamp_dir, exist_ok=True)
+
+        if formato == "ndjson":
+            base = self._ultimo_backup_ndjson(backup_dir, db_name, backup_timestamp_dir) if incremental else None
+            return self._backup_ndjson(backup_timestamp_dir, db_name, compressao, batch_size, threads, base)
         
         # Para cada collection no banco
         for collection_name in self.db.list_collection_names():
-            collection = self.db[collection_name]
-            
             # Nome do arquivo de backup
             filename = f"{collection_name}.json"
             filepath = os.path.join(backup_timestamp_dir, filename)
             
-            # Recupera todos os documentos
-            documents = list(collection.find({}))
-            
-            # Remove o campo _id
-            for doc in documents:
-                doc.pop('_id', None)
-            
-            # Salva em arquivo JSON
+            # Grava o array JSON documento a documento, sem carregar a collection inteira (mesmo formato do json.dump)
             with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(documents, f, ensure_ascii=False, indent=2)
+                separador = "[\n"
+                for doc in self.iter_documentos(projecao={"_id": 0}, batch_size=batch_size,
+                                               collection_name=collection_name):
+                    f.write(separador)
+                    f.write(textwrap.indent(json.dumps(doc, ensure_ascii=False, indent=2, default=str), "  "))
+                    separador = ",\n"
+                f.write("[]" if separador == "[\n" else "\n]")
             
             print(f"Backup da collection {collection_name} salvo em: {filepath}")
         
@@ -714,6 +1381,349 @@ class BrasileiraoAPI:
         
         return backup_timestamp_dir
     
+    def _backup_ndjson(self, backup_dir, db_name, compressao, batch_size=None, threads=None, base=None):
+        # Uma collection por thread: o cursor e a compressão (zlib/zstd liberam o GIL) rodam em paralelo.
+        # Com base (snapshot anterior), só os documentos novos ou alterados são gravados.
+        import json
+        import os
+        from concurrent.futures import ThreadPoolExecutor
+
+        inicio = perf_counter()
+        cadeia = self._cadeia_backup(base) if base else None
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futuros = {}
+            for nome in self.db.list_collection_names():
+                anterior = None
+                if cadeia and nome in cadeia[0][1]["collections"]:
+                    anterior = self._indice_backup(cadeia, nome)
+                futuros[nome] = executor.submit(self._backup_collection_ndjson, nome, backup_dir, compressao,
+                                                batch_size, anterior)
+            collections = {nome: futuro.result() for nome, futuro in futuros.items()}
+
+        # O manifesto é gravado por último: sem ele o backup está incompleto
+        manifesto = {
+            "db": db_name,
+            "criado_em": datetime.now().isoformat(timespec="seconds"),
+            "formato": "ndjson",
+            "compressao": compressao,
+            "tipo": "incremental" if base else "completo",
+            "base": os.path.relpath(base, os.path.dirname(backup_dir)) if base else None,
+            "collections": collections
+        }
+        with open(os.path.join(backup_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifesto, f, ensure_ascii=False, indent=2)
+
+        for nome, info in collections.items():
+            print(f"Backup da collection {nome} salvo em: {os.path.join(backup_dir, info['arquivo'])} "
+                  f"({info['documentos']} documentos, {info['gravados']} gravados, "
+                  f"{len(info['removidos'])} removidos, {info['bytes'] / 1024:.0f} KiB)")
+        print(f"\nBackup {manifesto['tipo']} do banco {db_name} salvo em: {backup_dir} "
+              f"({perf_counter() - inicio:.2f}s)")
+        return backup_dir
+
+    def _backup_collection_ndjson(self, collection_name, backup_dir, compressao, batch_size=None, anterior=None):
+        import os
+
+        # Cada linha tem um hash; o índice _id -> hash permite ao próximo backup gravar só o que mudou.
+        # Em snapshots incrementais o índice também só leva as entradas gravadas.
+        extensao = self.BACKUP_EXTENSOES[compressao]
+        path = os.path.join(backup_dir, collection_name + extensao)
+        path_indice = os.path.join(backup_dir, collection_name + ".indice" + extensao)
+        indice = {}
+        gravados = 0
+        with self._abrir_ndjson(path, "w", compressao) as f, self._abrir_ndjson(path_indice, "w", compressao) as f_indice:
+            for doc in self.iter_documentos(batch_size=batch_size, collection_name=collection_name):
+                linha = self._linha_backup(doc)
+                chave = self._chave_backup(doc)
+                hash_linha = self._hash_linha_backup(linha)
+                indice[chave] = hash_linha
+                if anterior is None or anterior.get(chave) != hash_linha:
+                    f.write(linha + "\n")
+                    f_indice.write(json.dumps([chave, hash_linha]) + "\n")
+                    gravados += 1
+
+        # Tombstones: documentos do snapshot anterior que não existem mais
+        removidos = [chave for chave in anterior if chave not in indice] if anterior else []
+        return {
+            "arquivo": os.path.basename(path),
+            "documentos": len(indice),
+            "gravados": gravados,
+            "removidos": removidos,
+            "indice": os.path.basename(path_indice),
+            "bytes": os.path.getsize(path),
+            "sha256": self._sha256_arquivo(path)
+        }
+
+    @staticmethod
+    def _linha_backup(doc):
+        from bson import json_util
+        # json_util preserva _id e datas (formato Extended JSON), então o arquivo pode ser restaurado sem perdas
+        return json_util.dumps(doc, json_options=json_util.RELAXED_JSON_OPTIONS, ensure_ascii=False)
+
+    @staticmethod
+    def _chave_backup(doc):
+        from bson import json_util
+        return json_util.dumps(doc["_id"], json_options=json_util.RELAXED_JSON_OPTIONS)
+
+    @staticmethod
+    def _hash_linha_backup(linha):
+        return hashlib.blake2b(linha.encode("utf-8"), digest_size=16).hexdigest()
+
+    @staticmethod
+    def _ler_manifesto(snapshot_dir):
+        import os
+        with open(os.path.join(snapshot_dir, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    @classmethod
+    def _ler_indice_backup(cls, snapshot_dir, manifesto, collection_name):
+        import os
+        path = os.path.join(snapshot_dir, manifesto["collections"][collection_name]["indice"])
+        with cls._abrir_ndjson(path, "r", manifesto["compressao"]) as f:
+            return dict(json.loads(linha) for linha in f)
+
+    @classmethod
+    def _indice_backup(cls, cadeia, collection_name):
+        # Índice completo do snapshot cadeia[0]: parte do backup completo e aplica as entradas e
+        # tombstones de cada incremental, do mais antigo para o mais novo
+        indice = {}
+        for diretorio, manifesto in reversed(cadeia):
+            info = manifesto["collections"].get(collection_name)
+            if info is None:
+                # Collection ausente neste snapshot: se voltar depois, foi gravada inteira
+                indice = {}
+                continue
+            indice.update(cls._ler_indice_backup(diretorio, manifesto, collection_name))
+            for chave in info["removidos"]:
+                indice.pop(chave, None)
+        return indice
+
+    @staticmethod
+    def _ultimo_backup_ndjson(backup_dir, db_name, ignorar=None):
+        # Snapshot NDJSON mais recente do banco (os nomes terminam no timestamp, então a ordem alfabética é cronológica)
+        import os
+        prefixo = f"{db_name}_backup_"
+        for nome in sorted(os.listdir(backup_dir), reverse=True):
+            snapshot_dir = os.path.join(backup_dir, nome)
+            if (nome.startswith(prefixo) and snapshot_dir != ignorar
+                    and os.path.exists(os.path.join(snapshot_dir, "manifest.json"))):
+                return snapshot_dir
+        return None
+
+    @classmethod
+    def _cadeia_backup(cls, snapshot_dir):
+        # Snapshot pedido seguido das suas bases, do mais novo até o backup completo
+        import os
+        cadeia = []
+        while snapshot_dir:
+            manifesto = cls._ler_manifesto(snapshot_dir)
+            cadeia.append((snapshot_dir, manifesto))
+            if manifesto.get("base"):
+                snapshot_dir = os.path.normpath(os.path.join(os.path.dirname(snapshot_dir), manifesto["base"]))
+            else:
+                snapshot_dir = None
+        return cadeia
+
+    @classmethod
+    def iter_documentos_backup(cls, snapshot_dir, collection_name):
+        # Reconstrói a collection de qualquer snapshot: o índice diz qual versão de cada documento vale e
+        # a cadeia é percorrida do mais novo para o mais antigo até todas as versões serem encontradas
+        import os
+        from bson import json_util
+
+        cadeia = cls._cadeia_backup(os.path.abspath(snapshot_dir))
+        pendentes = cls._indice_backup(cadeia, collection_name)
+        for diretorio, manifesto in cadeia:
+            if not pendentes:
+                break
+            info = manifesto["collections"].get(collection_name)
+            if info is None:
+                continue
+            with cls._abrir_ndjson(os.path.join(diretorio, info["arquivo"]), "r", manifesto["compressao"]) as f:
+                for linha in f:
+                    linha = linha.rstrip("\n")
+                    doc = json_util.loads(linha)
+                    chave = cls._chave_backup(doc)
+                    if pendentes.get(chave) == cls._hash_linha_backup(linha):
+                        del pendentes[chave]
+                        yield doc
+        if pendentes:
+            raise ValueError(f"Snapshot {snapshot_dir} incompleto: {len(pendentes)} documentos de "
+                             f"'{collection_name}' não foram encontrados na cadeia de backups")
+
+    def reconstruir_backup(self, snapshot_dir, destino_dir, compressao="gzip"):
+        # Materializa um snapshot incremental como backup completo e independente da cadeia
+        import os
+
+        manifesto = self._ler_manifesto(snapshot_dir)
+        os.makedirs(destino_dir, exist_ok=True)
+        extensao = self.BACKUP_EXTENSOES[compressao]
+        collections = {}
+        for nome in manifesto["collections"]:
+            path = os.path.join(destino_dir, nome + extensao)
+            path_indice = os.path.join(destino_dir, nome + ".indice" + extensao)
+            documentos = 0
+            with self._abrir_ndjson(path, "w", compressao) as f, \
+                    self._abrir_ndjson(path_indice, "w", compressao) as f_indice:
+                for doc in self.iter_documentos_backup(snapshot_dir, nome):
+                    linha = self._linha_backup(doc)
+                    f.write(linha + "\n")
+                    f_indice.write(json.dumps([self._chave_backup(doc), self._hash_linha_backup(linha)]) + "\n")
+                    documentos += 1
+            collections[nome] = {
+                "arquivo": os.path.basename(path),
+                "documentos": documentos,
+                "gravados": documentos,
+                "removidos": [],
+                "indice": os.path.basename(path_indice),
+                "bytes": os.path.getsize(path),
+                "sha256": self._sha256_arquivo(path)
+            }
+
+        manifesto = dict(manifesto, compressao=compressao, tipo="completo", base=None, collections=collections)
+        with open(os.path.join(destino_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifesto, f, ensure_ascii=False, indent=2)
+        print(f"Snapshot {snapshot_dir} reconstruído em: {destino_dir}")
+        return destino_dir
+
+    @staticmethod
+    def _abrir_ndjson(path, modo, compressao=None):
+        # Abre o arquivo em modo texto ("r" ou "w"), comprimindo/descomprimindo em fluxo
+        if compressao == "gzip":
+            import gzip
+            return gzip.open(path, modo + "t", encoding="utf-8", compresslevel=6)
+        if compressao == "zstd":
+            import io
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError("Backups zstd precisam do pacote opcional 'zstandard' (pip install zstandard).") from None
+            arquivo = open(path, modo + "b")
+            if modo == "w":
+                fluxo = zstandard.ZstdCompressor(level=3).stream_writer(arquivo)
+            else:
+                fluxo = zstandard.ZstdDecompressor().stream_reader(arquivo)
+            return io.TextIOWrapper(fluxo, encoding="utf-8")
+        return open(path, modo, encoding="utf-8")
+
+    @staticmethod
+    def _sha256_arquivo(path, chunk_size=1 << 20):
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for bloco in iter(lambda: f.read(chunk_size), b""):
+                sha256.update(bloco)
+        return sha256.hexdigest()
+
+    @_invalida_cache
+    def restaurar_backup(self, path, substituir=False, batch_size=1000, threads=4):
+        # Aceita tanto os snapshots NDJSON (completos ou incrementais, com manifest.json)
+        # quanto os diretórios antigos com um array JSON por collection
+        import os
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+        from itertools import islice
+
+        inicio = perf_counter()
+        if os.path.exists(os.path.join(path, "manifest.json")):
+            # A cadeia inteira é resolvida antes de tocar no banco: base ausente ou arquivo faltando falham aqui
+            cadeia = self._cadeia_backup(os.path.abspath(path))
+            faltando = [
+                os.path.join(diretorio, arquivo)
+                for diretorio, manifesto in cadeia
+                for info in manifesto["collections"].values()
+                for arquivo in (info["arquivo"], info["indice"])
+                if not os.path.exists(os.path.join(diretorio, arquivo))
+            ]
+            if faltando:
+                raise FileNotFoundError(f"Cadeia do backup {path} incompleta: {', '.join(faltando)}")
+            manifesto = cadeia[0][1]
+            fontes = {
+                nome: (self.iter_documentos_backup(path, nome), info["documentos"])
+                for nome, info in manifesto["collections"].items()
+            }
+        else:
+            fontes = {
+                arquivo[:-len(".json")]: (
+                    map(self._normalizar_documento_legado, self._ler_json_incremental(os.path.join(path, arquivo))),
+                    None
+                )
+                for arquivo in sorted(os.listdir(path)) if arquivo.endswith(".json")
+            }
+
+        ocupadas = [nome for nome in fontes if self.db[nome].estimated_document_count()]
+        if ocupadas and not substituir:
+            raise ValueError(f"Collections já possuem documentos: {', '.join(ocupadas)} (use substituir=True)")
+
+        # A carga vai para collections temporárias; as originais só são substituídas depois que
+        # todas foram lidas e conferidas, então um backup com defeito não apaga os dados atuais
+        temporarias = {nome: f"{nome}_restauracao" for nome in fontes}
+        resultado = {}
+        try:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                for nome, (documentos, esperados) in fontes.items():
+                    # Collection vazia e sem índices secundários durante a carga; eles vêm no final
+                    self.db.drop_collection(temporarias[nome])
+                    collection = self.db[temporarias[nome]]
+                    lidos = 0
+                    pendentes = set()
+                    while True:
+                        lote = list(islice(documentos, batch_size))
+                        if not lote:
+                            break
+                        lidos += len(lote)
+                        # Limita os lotes em voo para a memória não crescer com o tamanho do backup
+                        if len(pendentes) >= 2 * threads:
+                            concluidos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                            for futuro in concluidos:
+                                futuro.result()
+                        pendentes.add(executor.submit(collection.insert_many, lote, ordered=False))
+                    for futuro in pendentes:
+                        futuro.result()
+                    resultado[nome] = {
+                        "esperados": lidos if esperados is None else esperados,
+                        "restaurados": collection.count_documents({})
+                    }
+
+            total = 0
+            divergentes = []
+            for nome, contagem in resultado.items():
+                total += contagem["restaurados"]
+                print(f"Collection {nome}: {contagem['restaurados']} de {contagem['esperados']} documentos lidos.")
+                if contagem["restaurados"] != contagem["esperados"]:
+                    divergentes.append(nome)
+            if divergentes:
+                raise RuntimeError(f"Contagem divergente do snapshot nas collections: {', '.join(divergentes)} "
+                                   f"(nenhuma collection foi alterada)")
+            # Os índices únicos só são criados depois da troca: as chaves repetidas são conferidas antes dela
+            for nome, temporaria in temporarias.items():
+                self._verificar_unicidade(self.db[temporaria], self._especificacoes_indices(nome), nome)
+        except BaseException:
+            for temporaria in temporarias.values():
+                self.db.drop_collection(temporaria)
+            raise
+
+        for nome, temporaria in temporarias.items():
+            if resultado[nome]["restaurados"]:
+                self.db[temporaria].rename(nome, dropTarget=True)
+            else:
+                # Collection vazia no backup: rename falharia, pois a temporária nunca foi criada
+                self.db.drop_collection(nome)
+        self.ensure_indexes()
+
+        duracao = perf_counter() - inicio
+        taxa = total / duracao if duracao > 0 else float("inf")
+        print(f"Backup {path} restaurado em {duracao:.2f}s ({taxa:.0f} documentos/s).")
+        return resultado
+
+    @classmethod
+    def _normalizar_documento_legado(cls, documento):
+        # Os backups JSON antigos guardam datas como texto (ou nem têm data_hora/chaves): recalcula a partir de data/hora
+        if "homeTeam" in documento and "awayTeam" in documento:
+            if documento.get("data"):
+                cls._adicionar_data_e_temporada(documento)
+            cls._adicionar_chaves_times(documento)
+        return documento
+
+    @_invalida_cache
     def verificar_e_inserir_documentos(self, collection_name):
 
         dados_brasileirao = [
@@ -812,28 +1822,18 @@ class BrasileiraoAPI:
             }
         ]
 
-        dados = dados_brasileirao if collection_name == "brasileirao" else dados_odds
+        if collection_name == "brasileirao":
+            dados = [
+                self._adicionar_chaves_times(self._adicionar_data_e_temporada(doc))
+                for doc in dados_brasileirao
+            ]
+        else:
+            dados = dados_odds
         documentos_novos = []
         documentos_existentes = 0
 
         for doc in dados:
-            # Monta o critério de busca específico para cada coleção
-            if collection_name == "brasileirao":
-                criterio = {
-                    "$and": [
-                        {"rodada": doc["rodada"]},
-                        {"data": doc["data"]},
-                        {"homeTeam.name": doc["homeTeam"]["name"]},
-                        {"awayTeam.name": doc["awayTeam"]["name"]}
-                    ]
-                }
-            else:  # odds_times_aggregados
-                criterio = {
-                    "$and": [
-                        {"time": doc["time"]},
-                        {"season": doc["season"]}
-                    ]
-                }
+            criterio = self._criterio_existencia(collection_name, doc)
             
             # Verifica se existe usando count_documents ao invés de find_one
             contagem = self.db[collection_name].count_documents(criterio)
@@ -848,6 +1848,8 @@ class BrasileiraoAPI:
             try:
                 self.db[collection_name].insert_many(documentos_novos)
                 print(f"\nInseridos {len(documentos_novos)} novos documentos em {collection_name}")
+                if collection_name == self.collection.name:
+                    self.atualizar_agregados(adicionadas=documentos_novos)
             except Exception as e:
                 print(f"Erro ao inserir documentos: {e}")
         
@@ -865,8 +1867,36 @@ class BrasileiraoAPI:
         return resultado
         
     
+    @staticmethod
+    def _criterio_existencia(collection_name, doc):
+        # Monta o critério de busca específico para cada coleção
+        if collection_name == "brasileirao":
+            return {
+                "$and": [
+                    {"rodada": doc["rodada"]},
+                    {"data": doc["data"]},
+                    {"homeTeam.name": doc["homeTeam"]["name"]},
+                    {"awayTeam.name": doc["awayTeam"]["name"]}
+                ]
+            }
+        # odds_times_aggregados
+        return {
+            "$and": [
+                {"time": doc["time"]},
+                {"season": doc["season"]}
+            ]
+        }
+
+    @_invalida_cache
     def editar_documentos(self, collection_name):
         if collection_name == "brasileirao":
+            manter_agregados = collection_name == self.collection.name
+            if manter_agregados:
+                # Guarda a versão anterior das partidas que as edições abaixo podem alterar
+                filtros = [{"hora": "20:00"}, {"homeTeam.name": "Santos"}, {"rodada": 1}, {"data": "15/04/2024"}]
+                projecao = dict(self.PROJECAO_PLACARES, _id=1)
+                antes = {doc["_id"]: doc for doc in self.collection.find({"$or": filtros}, projecao)}
+
             self.db[collection_name].update_many(
                 {"hora": "20:00"},
                 {"$set": {"hora": "21:30"}}
@@ -894,6 +1924,24 @@ class BrasileiraoAPI:
                 {"data": "15/04/2024"},
                 {"$set": {"data": "22/04/2024"}}
             )
+
+            if manter_agregados:
+                # Correção: subtrai o resultado antigo e soma o novo só nas partidas que mudaram
+                depois = {doc["_id"]: doc for doc in self.collection.find({"_id": {"$in": list(antes)}}, projecao)}
+                alteradas = [
+                    _id for _id, doc in antes.items()
+                    if self._resumo_partida(doc) != self._resumo_partida(depois.get(_id))
+                ]
+                self.atualizar_agregados(
+                    adicionadas=[depois[_id] for _id in alteradas if _id in depois],
+                    removidas=[antes[_id] for _id in alteradas]
+                )
+
+            # data e hora mudaram, então data_hora e season precisam acompanhar em todas as partidas editadas
+            # (a troca de season, se houver, é levada aos agregados pelo próprio migrar_datas_e_temporadas)
+            self.migrar_datas_e_temporadas(
+                {"$or": [{"hora": "21:30"}, {"data": "22/04/2024"}]}, collection_name=collection_name
+            )
             
         else:  
             
@@ -948,6 +1996,9 @@ class BrasileiraoAPI:
             print(f"- {jogo['homeTeam']['name']} vs {jogo['awayTeam']['name']}")
 
     def buscar_todos_documentos(self, collection_name):
-        return list(self.db[collection_name].find())
+        return list(self.iter_todos_documentos(collection_name))
+
+    def iter_todos_documentos(self, collection_name, batch_size=None):
+        return self.iter_documentos(batch_size=batch_size, collection_name=collection_name)
     
     
\ No newline at end of file
@@ -0,0 +1,288 @@
+import os
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+# Gráficos da BrasileiraoAPI. Fica fora de brasileirao_api para que jobs sem gráficos (carga, backup)
+# não paguem o import do matplotlib; o pyplot só é importado pelos plot_* interativos.
+
+
+def gols_do_time(partidas, nome_time):
+    # Partidas do time em ordem cronológica, com os gols do ponto de vista dele
+    partidas = partidas[(partidas['home'] == nome_time) | (partidas['away'] == nome_time)]
+    partidas = partidas.sort_values('data_hora')
+    em_casa = (partidas['home'] == nome_time).to_numpy()
+    return pd.DataFrame({
+        'data_hora': partidas['data_hora'].to_numpy(),
+        'gols_marcados': np.where(em_casa, partidas['home_goals'], partidas['away_goals']).astype(int),
+        'gols_sofridos': np.where(em_casa, partidas['away_goals'], partidas['home_goals']).astype(int)
+    })
+
+
+def contar_resultados(gols):
+    return pd.Series({
+        'Vitória': int((gols['gols_marcados'] > gols['gols_sofridos']).sum()),
+        'Derrota': int((gols['gols_marcados'] < gols['gols_sofridos']).sum()),
+        'Empate': int((gols['gols_marcados'] == gols['gols_sofridos']).sum())
+    })
+
+
+# Funções de desenho compartilhadas pelos plot_* e pela exportação em lote.
+# Recebem o Axes pronto e não dependem do estado do pyplot, então rodam em processos sem display.
+
+def _desenhar_bar(ax, resultados, titulo):
+    resultados.plot(kind='bar', color=['green', 'red', 'grey'], ax=ax)
+    ax.set_title(titulo)
+    ax.set_xlabel('Resultado')
+    ax.set_ylabel('Número de Partidas')
+    ax.tick_params(axis='x', labelrotation=0)
+
+
+def _desenhar_desempenho_temporada(ax, nome_time, gols):
+    total_gols = gols['gols_marcados'] + gols['gols_sofridos']
+    ax.scatter(gols['data_hora'], gols['gols_marcados'],
+               s=total_gols*100, alpha=0.6, label='Gols Marcados')
+    ax.scatter(gols['data_hora'], gols['gols_sofridos'],
+               s=total_gols*100, alpha=0.6, label='Gols Sofridos')
+
+    ax.set_title(f'Desempenho do {nome_time} na Temporada')
+    ax.set_xlabel('Data')
+    ax.set_ylabel('Número de Gols')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+    ax.tick_params(axis='x', labelrotation=45)
+
+
+def _desenhar_desempenho_time(ax, nome_time, dados):
+    temporadas = [doc["season"] for doc in dados]
+    medias_desempenho = [
+        np.mean([doc["odds"]["homeWin"] or 0, doc["odds"]["draw"] or 0, doc["odds"]["awayWin"] or 0])
+        for doc in dados
+    ]
+    ax.scatter(temporadas, medias_desempenho, s=100, alpha=0.7, c='blue', label=nome_time)
+
+    # Ajusta a reta de regressão (as temporadas são numéricas); com uma temporada só não há reta
+    if len(temporadas) > 1:
+        coef, intercept = np.polyfit(temporadas, medias_desempenho, 1)
+        x_line = np.linspace(min(temporadas), max(temporadas), 100)
+        y_line = coef * x_line + intercept
+        ax.plot(x_line, y_line, "r--", alpha=0.8, label=f"y = {coef:.2f}x + {intercept:.2f}")
+
+    ax.set_xlabel("Temporadas")
+    ax.set_ylabel("Média de Desempenho")
+    ax.set_title(f"Desempenho do {nome_time} ao longo das Temporadas")
+    ax.set_xticks(temporadas)
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+
+
+def _desenhar_media_porcentagem_time(ax, nome_time, dados):
+    temporadas = [doc["season"] for doc in dados]
+    vit_percent = [round((doc["odds"]["homeWin"] or 0) * 100, 2) for doc in dados]
+    emp_percent = [round((doc["odds"]["draw"] or 0) * 100, 2) for doc in dados]
+    der_percent = [round((doc["odds"]["awayWin"] or 0) * 100, 2) for doc in dados]
+
+    # Configuração do gráfico de barras agrupadas
+    x = np.arange(len(temporadas))
+    largura = 0.25
+
+    bars1 = ax.bar(x - largura, vit_percent, width=largura, color='green', label='Vitórias (%)')
+    bars2 = ax.bar(x, emp_percent, width=largura, color='gray', label='Empates (%)')
+    bars3 = ax.bar(x + largura, der_percent, width=largura, color='red', label='Derrotas (%)')
+
+    ax.set_xlabel("Temporadas")
+    ax.set_ylabel("Porcentagem (%)")
+    ax.set_title(f"Média Percentual de Desempenho do {nome_time} por Temporada")
+    ax.set_xticks(x, temporadas)
+    ax.tick_params(axis='x', labelrotation=45)
+
+    # Configura os ticks do eixo y de 5 em 5
+    max_y = max(max(vit_percent), max(emp_percent), max(der_percent))
+    y_max = (int(max_y / 5) + 1) * 5
+    ax.set_yticks(np.arange(0, y_max+1, 5))
+
+    # Grid com major e minor ticks
+    ax.minorticks_on()
+    ax.grid(axis='y', which='major', linestyle='-', linewidth=0.5, alpha=0.7)
+    ax.grid(axis='y', which='minor', linestyle='--', linewidth=0.5, alpha=0.5)
+
+    for bars in [bars1, bars2, bars3]:
+        for bar in bars:
+            height = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width()/2.0, height, f'{height:.1f}%',
+                    ha='center', va='bottom', fontsize=8)
+
+    ax.legend()
+
+
+def _renderizar_graficos_time(tarefa):
+    # Executado nos processos do pool: Figure sem pyplot desenha direto no backend Agg (PNG/SVG)
+    import re
+    from matplotlib.figure import Figure
+
+    nome_time, gols, odds, diretorio, formatos, titulo_bar = tarefa
+    graficos = {
+        "resultados": ((8, 6), _desenhar_bar, (contar_resultados(gols), titulo_bar.format(time=nome_time))),
+        "desempenho_temporada": ((12, 6), _desenhar_desempenho_temporada, (nome_time, gols)),
+        "desempenho_time": ((12, 8), _desenhar_desempenho_time, (nome_time, odds)),
+        "media_porcentagem_time": ((12, 8), _desenhar_media_porcentagem_time, (nome_time, odds))
+    }
+
+    base = re.sub(r"[^\w-]+", "_", nome_time).strip("_")
+    arquivos = []
+    for nome_grafico, (tamanho, desenhar, argumentos) in graficos.items():
+        if nome_grafico in ("desempenho_time", "media_porcentagem_time") and not odds:
+            continue
+        fig = Figure(figsize=tamanho)
+        desenhar(fig.add_subplot(), *argumentos)
+        fig.tight_layout()
+        for formato in formatos:
+            arquivo = os.path.join(diretorio, f"{base}_{nome_grafico}.{formato}")
+            fig.savefig(arquivo, format=formato)
+            arquivos.append(arquivo)
+    return arquivos
+
+
+def _odds_do_time(api, nome_time):
+    return list(api.db["odds_times_aggregados"].find(
+        {"time": nome_time}, {"_id": 0, "season": 1, "odds": 1}
+    ).sort("season", 1))
+
+
+def plot_bar(resultados, time):
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(8,6))
+    _desenhar_bar(plt.gca(), resultados, f'Resultados do {time} no Brasileirão 2023')
+    plt.show()
+
+
+def plot_desempenho_temporada(api, nome_time):
+    import matplotlib.pyplot as plt
+
+    partidas = api.carregar_partidas_planas(api._filtro_partidas_time(nome_time))
+
+    plt.figure(figsize=(12,6))
+    _desenhar_desempenho_temporada(plt.gca(), nome_time, gols_do_time(partidas, nome_time))
+    plt.tight_layout()
+    plt.show()
+
+
+def plot_desempenho_time(api, nome_time):
+    import matplotlib.pyplot as plt
+
+    dados = _odds_do_time(api, nome_time)
+    if not dados:
+        print(f"Nenhum dado encontrado para o time {nome_time}")
+        return
+
+    plt.figure(figsize=(12, 8))
+    _desenhar_desempenho_time(plt.gca(), nome_time, dados)
+    plt.tight_layout()
+    plt.show()
+
+
+def plot_media_porcentagem_time(api, nome_time):
+    import matplotlib.pyplot as plt
+
+    dados = _odds_do_time(api, nome_time)
+    if not dados:
+        print(f"Nenhum dado encontrado para o time {nome_time}")
+        return
+
+    plt.figure(figsize=(12, 8))
+    _desenhar_media_porcentagem_time(plt.gca(), nome_time, dados)
+    plt.tight_layout()
+    plt.show()
+
+
+def exportar_graficos_times(api, diretorio="../../data/graficos", formatos=("png",), times=None,
+                            start_year=2003, end_year=2022, processos=None):
+    # Modo relatório (sem display): uma leitura para todos os times e renderização em paralelo
+    from concurrent.futures import ProcessPoolExecutor
+
+    inicio = perf_counter()
+    partidas = api.carregar_partidas_planas({"season": {"$gte": start_year, "$lte": end_year}})
+    odds_por_time = {}
+    for doc in sorted(api.calcular_odds(partidas, start_year, end_year), key=lambda doc: doc["season"]):
+        odds_por_time.setdefault(doc["time"], []).append(doc)
+    if times is None:
+        times = sorted(odds_por_time)
+
+    os.makedirs(diretorio, exist_ok=True)
+    titulo_bar = "Resultados do {time} no Brasileirão " + f"{start_year}-{end_year}"
+    tarefas = []
+    for time in times:
+        gols = gols_do_time(partidas, time)
+        if gols.empty:
+            print(f"Nenhuma partida encontrada para o time {time}")
+            continue
+        tarefas.append((time, gols, odds_por_time.get(time, []), diretorio, tuple(formatos), titulo_bar))
+
+    if processos == 1:
+        arquivos = [arquivo for tarefa in tarefas for arquivo in _renderizar_graficos_time(tarefa)]
+    else:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            arquivos = [arquivo for lote in executor.map(_renderizar_graficos_time, tarefas) for arquivo in lote]
+
+    print(f"Exportados {len(arquivos)} gráficos de {len(tarefas)} times em {diretorio} "
+          f"({perf_counter() - inicio:.2f}s).")
+    return arquivos
+
+
+def plot_desempenho_todos_times(api):
+    import matplotlib.pyplot as plt
+
+    docs = list(api.db["odds_times_aggregados"].find(
+        {}, {"_id": 0, "time": 1, "season": 1, "jogos": 1, "pontos": 1}
+    ))
+    if not docs:
+        print("Nenhum dado encontrado para exibir.")
+        return
+
+    teams = sorted(set(doc["time"] for doc in docs))
+    cmap = plt.get_cmap("tab20", len(teams))
+    colors = {team: cmap(i) for i, team in enumerate(teams)}
+
+    plt.figure(figsize=(12, 8))
+    performance_values = []
+
+    # Para cada documento, calcula a performance como pontos / (jogos * 3)
+    for doc in docs:
+        season = int(doc["season"])
+        jogos = doc.get("jogos", 0)
+        pontos = doc.get("pontos", 0)
+        performance = pontos / (jogos * 3) if jogos > 0 else 0
+        performance_values.append(performance)
+        team = doc["time"]
+        plt.scatter(season, performance, color=colors[team], alpha=0.7, s=100)
+
+    # Adiciona uma reta horizontal representando a média geral de performance
+    media_geral = np.mean(performance_values)
+    plt.axhline(y=media_geral, color='black', linestyle='--', linewidth=2, label=f"Média Geral ({media_geral:.2f})")
+
+    # Cria uma legenda sem duplicatas (um item por time)
+    legend_handles = []
+    for team in teams:
+        handle = plt.Line2D([], [], marker='o', linestyle='None',
+                            markersize=8, color=colors[team])
+        legend_handles.append(handle)
+
+    # Adiciona a linha da média geral à legenda
+    legend_handles.append(plt.Line2D([], [], color='black', linestyle='--', linewidth=2))
+    teams.append("Média Geral")
+
+    plt.legend(legend_handles, teams, bbox_to_anchor=(1.05, 1),
+            loc='upper left', borderaxespad=0.)
+    plt.xlabel("Temporadas")
+    plt.ylabel("Performance (%)")
+    plt.title("Performance dos Times ao longo das Temporadas (Pontos / (Jogos × 3))")
+
+    # Ajusta o eixo x com as temporadas
+    temporadas = sorted(set(int(doc["season"]) for doc in docs))
+    plt.xticks(temporadas, rotation=45)
+    plt.grid(True, alpha=0.3)
+    plt.tight_layout()
+    plt.show()
@@ -0,0 +1,209 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from registro_times import normalizar_time
+
+
+class MatchStore:
+    # Histórico inteiro em arrays NumPy (uma coluna por campo) para consultas sem ida ao MongoDB.
+    # Os times são internados: home/away guardam o id (posição em self.times).
+    COLUNAS = ("season", "rodada", "data_hora", "home", "away", "home_goals", "away_goals")
+
+    def __init__(self, times, season, rodada, data_hora, home, away, home_goals, away_goals, indice=None):
+        self.times = list(times)
+        self.season = np.asarray(season, dtype=np.int16)
+        self.rodada = np.asarray(rodada, dtype=np.int8)
+        self.data_hora = np.asarray(data_hora, dtype="datetime64[ns]")
+        self.home = np.asarray(home, dtype=np.int32)
+        self.away = np.asarray(away, dtype=np.int32)
+        self.home_goals = np.asarray(home_goals, dtype=np.int8)
+        self.away_goals = np.asarray(away_goals, dtype=np.int8)
+
+        self._ids = {nome: i for i, nome in enumerate(self.times)}
+        # Grafias diferentes do mesmo clube ("São Paulo" / "Sao Paulo") dividem a chave canônica
+        self._ids_canonicos = {}
+        for i, nome in enumerate(self.times):
+            self._ids_canonicos.setdefault(normalizar_time(nome), []).append(i)
+        if indice is None:
+            self._indexar_times()
+        else:
+            self._partidas_time, self._inicio_time = indice
+
+    @classmethod
+    def de_dataframe(cls, partidas):
+        # partidas no formato de BrasileiraoAPI.carregar_partidas_planas (home/away com as mesmas categorias)
+        return cls(
+            times=partidas["home"].cat.categories,
+            season=partidas["season"].to_numpy(),
+            rodada=partidas["rodada"].to_numpy(),
+            data_hora=partidas["data_hora"].to_numpy(),
+            home=partidas["home"].cat.codes.to_numpy(),
+            away=partidas["away"].cat.codes.to_numpy(),
+            home_goals=partidas["home_goals"].to_numpy(),
+            away_goals=partidas["away_goals"].to_numpy()
+        )
+
+    def __len__(self):
+        return len(self.season)
+
+    def salvar(self, diretorio):
+        # Um .npy por coluna (e pelo índice por time) mais o dicionário de nomes em times.json
+        os.makedirs(diretorio, exist_ok=True)
+        for coluna in self.COLUNAS:
+            np.save(os.path.join(diretorio, f"{coluna}.npy"), getattr(self, coluna))
+        np.save(os.path.join(diretorio, "partidas_time.npy"), self._partidas_time)
+        np.save(os.path.join(diretorio, "inicio_time.npy"), self._inicio_time)
+        with open(os.path.join(diretorio, "times.json"), "w", encoding="utf-8") as f:
+            json.dump(self.times, f, ensure_ascii=False)
+        return diretorio
+
+    @classmethod
+    def carregar(cls, diretorio, mmap_mode="r"):
+        # Com mmap_mode as colunas são mapeadas do disco sem cópia; processos diferentes dividem as mesmas páginas
+        colunas = {coluna: np.load(os.path.join(diretorio, f"{coluna}.npy"), mmap_mode=mmap_mode)
+                   for coluna in cls.COLUNAS}
+        indice = (np.load(os.path.join(diretorio, "partidas_time.npy"), mmap_mode=mmap_mode),
+                  np.load(os.path.join(diretorio, "inicio_time.npy"), mmap_mode=mmap_mode))
+        with open(os.path.join(diretorio, "times.json"), encoding="utf-8") as f:
+            times = json.load(f)
+        return cls(times, indice=indice, **colunas)
+
+    def _indexar_times(self):
+        # Índice por time no formato CSR: as partidas do time t ficam em
+        # self._partidas_time[self._inicio_time[t]:self._inicio_time[t + 1]], em ordem cronológica de carga
+        n = len(self)
+        times = np.concatenate([self.home, self.away])
+        partidas = np.concatenate([np.arange(n), np.arange(n)])
+        ordem = np.lexsort((partidas, times))
+        self._partidas_time = partidas[ordem]
+        self._inicio_time = np.searchsorted(times[ordem], np.arange(len(self.times) + 1))
+
+    def id_time(self, nome):
+        return self._ids.get(nome, -1)
+
+    def ids_canonicos(self, nome):
+        return np.array(self._ids_canonicos.get(normalizar_time(nome), []), dtype=np.int32)
+
+    def indices_time(self, nome, canonico=False):
+        times = self.ids_canonicos(nome) if canonico else [self.id_time(nome)]
+        fatias = [
+            self._partidas_time[self._inicio_time[time]:self._inicio_time[time + 1]]
+            for time in times if time >= 0
+        ]
+        if not fatias:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(fatias)) if len(fatias) > 1 else fatias[0]
+
+    def para_dataframe(self, indices=None):
+        if indices is None:
+            indices = slice(None)
+        categorias = pd.CategoricalDtype(self.times)
+        return pd.DataFrame({
+            "season": self.season[indices],
+            "rodada": self.rodada[indices],
+            "data_hora": self.data_hora[indices],
+            "home": pd.Categorical.from_codes(self.home[indices], dtype=categorias),
+            "away": pd.Categorical.from_codes(self.away[indices], dtype=categorias),
+            "home_goals": self.home_goals[indices],
+            "away_goals": self.away_goals[indices]
+        })
+
+    # Mesmas consultas da BrasileiraoAPI, respondidas com o índice por time ou máscaras booleanas
+
+    def obter_partidas_time(self, nome_time):
+        return self.para_dataframe(self.indices_time(nome_time))
+
+    def buscar_partidas_por_confronto(self, time1, time2):
+        # Como na API, os nomes são comparados pela chave canônica (sem caixa nem acentos)
+        indices = self.indices_time(time1, canonico=True)
+        adversarios = self.ids_canonicos(time2)
+        mascara = np.isin(self.home[indices], adversarios) | np.isin(self.away[indices], adversarios)
+        return self.para_dataframe(indices[mascara])
+
+    def buscar_partidas_por_time_or(self, time1, time2):
+        mascara = (self.home == self.id_time(time1)) | (self.away == self.id_time(time2))
+        return self.para_dataframe(np.flatnonzero(mascara))
+
+    def buscar_partidas_por_rodadas(self, rodadas):
+        return self.para_dataframe(np.flatnonzero(np.isin(self.rodada, rodadas)))
+
+
+class MatrizConfrontos:
+    # Tensor time x time x temporada com o resultado dos jogos do mandante i contra o visitante j.
+    # Os times são indexados pela chave canônica; qualquer confronto é uma fatia O(1) do array.
+    ESTATISTICAS = ["vitorias", "empates", "derrotas", "gols_marcados", "gols_sofridos"]
+
+    def __init__(self, chaves, nomes, temporadas, tensor):
+        self.chaves = list(chaves)
+        self.nomes = list(nomes)
+        self.temporadas = np.asarray(temporadas, dtype=np.int16)
+        self.tensor = tensor
+        self._indices = {chave: i for i, chave in enumerate(self.chaves)}
+
+    @classmethod
+    def de_match_store(cls, store):
+        # Uma passada sobre as partidas: np.add.at acumula cada jogo na célula (mandante, visitante, temporada)
+        chaves = []
+        nomes = []
+        canonico = np.empty(len(store.times), dtype=np.int32)
+        for i, nome in enumerate(store.times):
+            chave = normalizar_time(nome)
+            if chave not in chaves:
+                chaves.append(chave)
+                nomes.append(nome)
+            canonico[i] = chaves.index(chave)
+
+        if len(store):
+            temporadas = np.arange(store.season.min(), store.season.max() + 1, dtype=np.int16)
+        else:
+            temporadas = np.empty(0, dtype=np.int16)
+        tensor = np.zeros((len(chaves), len(chaves), len(temporadas), len(cls.ESTATISTICAS)), dtype=np.int32)
+
+        home_goals = store.home_goals.astype(np.int32)
+        away_goals = store.away_goals.astype(np.int32)
+        valores = np.stack([
+            home_goals > away_goals,
+            home_goals == away_goals,
+            home_goals < away_goals,
+            home_goals,
+            away_goals
+        ], axis=1).astype(np.int32)
+        posicao = (canonico[store.home], canonico[store.away], store.season - temporadas[:1].astype(np.int64))
+        np.add.at(tensor, posicao, valores)
+        return cls(chaves, nomes, temporadas, tensor)
+
+    def salvar(self, path):
+        np.savez(path, chaves=np.array(self.chaves), nomes=np.array(self.nomes),
+                 temporadas=self.temporadas, tensor=self.tensor)
+        return path
+
+    @classmethod
+    def carregar(cls, path):
+        with np.load(path) as dados:
+            return cls(dados["chaves"].tolist(), dados["nomes"].tolist(), dados["temporadas"], dados["tensor"])
+
+    def _fatia_temporadas(self, start_year=None, end_year=None):
+        inicio = 0 if start_year is None else int(np.searchsorted(self.temporadas, start_year))
+        fim = len(self.temporadas) if end_year is None else int(np.searchsorted(self.temporadas, end_year, "right"))
+        return slice(inicio, fim)
+
+    def confronto(self, time1, time2, start_year=None, end_year=None):
+        # Estatísticas do time1 contra o time2, separadas em casa e fora
+        i = self._indices.get(normalizar_time(time1))
+        j = self._indices.get(normalizar_time(time2))
+        vazio = np.zeros(len(self.ESTATISTICAS), dtype=np.int64)
+        if i is None or j is None:
+            em_casa = fora = vazio
+        else:
+            temporadas = self._fatia_temporadas(start_year, end_year)
+            em_casa = self.tensor[i, j, temporadas].sum(axis=0)
+            # No jogo como visitante, a vitória do mandante j é derrota do time1 e os gols se invertem
+            fora = self.tensor[j, i, temporadas].sum(axis=0)[[2, 1, 0, 4, 3]]
+        return {
+            "em_casa": dict(zip(self.ESTATISTICAS, em_casa.tolist())),
+            "fora": dict(zip(self.ESTATISTICAS, fora.tolist())),
+            "total": dict(zip(self.ESTATISTICAS, (em_casa + fora).tolist()))
+        }
@@ -0,0 +1,27 @@
+import unicodedata
+
+# Registro canônico dos times: a chave é o nome em minúsculas, sem acentos e com espaços
+# normalizados; nomes alternativos do mesmo clube apontam para a mesma chave.
+ALIASES = {
+    "athletico paranaense": "athletico-pr",
+    "atletico paranaense": "athletico-pr",
+    "atletico-pr": "athletico-pr",
+    "atletico mineiro": "atletico-mg",
+    "atletico goianiense": "atletico-go",
+    "america mineiro": "america-mg",
+    "botafogo": "botafogo-rj",
+    "vasco da gama": "vasco",
+    "red bull bragantino": "bragantino",
+    "sport recife": "sport",
+    "ec vitoria": "vitoria",
+    "spfc": "sao paulo"
+}
+
+
+def normalizar_time(nome):
+    if nome is None:
+        return None
+    sem_acentos = unicodedata.normalize("NFKD", str(nome))
+    sem_acentos = "".join(c for c in sem_acentos if not unicodedata.combining(c))
+    chave = " ".join(sem_acentos.lower().split())
+    return ALIASES.get(chave, chave)